@@ -0,0 +1,339 @@
+"""
+UCI entry point:
+
+    python main.py
+    python main.py --profile prof/      # profile every search into prof/go-NNN.* (src/profiling.py)
+
+Reads UCI commands from stdin. Searches run on a background thread so that
+"stop", "ponderhit" and "isready" are answered while the engine is thinking,
+and one warm process can serve any number of games.
+
+The transposition table is kept between moves (until "ucinewgame"), and bestmove
+carries the expected reply as its ponder move. "go ponder" searches that reply
+with no clock; "ponderhit" starts the normal time limit on the running search,
+while "stop" after a miss keeps whatever it already stored in the TT.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import threading
+
+import chess
+
+from src import search
+from src.board import GameState
+from src.book import configure_opening_book
+from src.endgame import load_kpk_bitbase
+from src.memory import DEFAULT_MEMORY_MB, configure_memory, format_report, memory_report
+from src.tablebase import configure_tablebases
+from src.timeman import TimeManager, MOVE_OVERHEAD_MS, MIN_MOVE_TIME_MS
+
+ENGINE_NAME = "BOT_CHESS_BTL"
+ENGINE_AUTHOR = "BOT_CHESS_BTL team"
+
+# Lines the engine may write as-is; anything else (e.g. log messages) is sent as "info string"
+UCI_PREFIXES = ("id ", "uciok", "readyok", "option ", "info ", "bestmove ")
+
+# Integer "go" parameters; the remaining go tokens are flags
+GO_INT_PARAMS = ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo", "mate")
+
+
+class UciOutput:
+    """stdout replacement: passes UCI lines through and wraps search chatter as 'info string'."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self._partial = ""
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self._partial += text
+            *lines, self._partial = self._partial.split("\n")
+            for line in lines:
+                line = line.rstrip("\r")
+                if not line:
+                    continue
+                if not line.startswith(UCI_PREFIXES):
+                    line = "info string " + line
+                self.stream.write(line + "\n")
+            self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+
+def parse_go(tokens: list[str]) -> dict:
+    params = {}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i]
+        if name in GO_INT_PARAMS and i + 1 < len(tokens):
+            params[name] = int(tokens[i + 1])
+            i += 2
+        else:
+            params[name] = True
+            i += 1
+    return params
+
+
+def allocate_time(params: dict, turn: chess.Color):
+    """TimeManager for this move, or None for an unlimited search."""
+    if "movetime" in params:
+        return TimeManager.fixed(max(MIN_MOVE_TIME_MS, params["movetime"] - MOVE_OVERHEAD_MS) / 1000)
+    left = params.get("wtime" if turn == chess.WHITE else "btime")
+    if left is None:
+        return None
+    inc = params.get("winc" if turn == chess.WHITE else "binc", 0)
+    return TimeManager.from_clock(left / 1000, inc / 1000, params.get("movestogo"))
+
+
+class UciEngine:
+    def __init__(self, output=sys.stdout, profile_dir: str = None):
+        self.output = output
+        self.profile_dir = profile_dir
+        self.profiled_searches = 0
+        self.state = GameState()
+        self.threads = 1
+        self.multipv = 1
+        self.own_book = True
+        self.book_file = ""
+        # Send the search counters (SearchStats) as "info string stats ..." after every depth
+        self.search_stats = False
+        self._thread = None
+        self._stop = None
+        # Set when bestmove may be sent; held back during "go infinite" and "go ponder"
+        self._release = threading.Event()
+        self._ponder_time = None
+
+    def send(self, line: str):
+        self.output.write(line + "\n")
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+
+    def uci(self):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send(f"id author {ENGINE_AUTHOR}")
+        self.send(f"option name Hash type spin default {DEFAULT_MEMORY_MB} min 1 max 4096")
+        self.send("option name Threads type spin default 1 min 1 max 512")
+        self.send("option name Ponder type check default false")
+        self.send("option name MultiPV type spin default 1 min 1 max 256")
+        self.send("option name OwnBook type check default true")
+        self.send("option name BookFile type string default <empty>")
+        self.send("option name SyzygyPath type string default <empty>")
+        self.send("option name SearchStats type check default false")
+        self.send("uciok")
+
+    def setoption(self, tokens: list[str]):
+        # setoption name <id...> [value <x...>]
+        if "name" not in tokens:
+            return
+        rest = tokens[tokens.index("name") + 1:]
+        if "value" in rest:
+            split = rest.index("value")
+            name, value = " ".join(rest[:split]), " ".join(rest[split + 1:])
+        else:
+            name, value = " ".join(rest), ""
+        name = name.lower()
+        if value == "<empty>":
+            value = ""
+
+        if name == "hash":
+            # The whole memory budget: TT, eval cache, book and tablebase caches (src/memory.py)
+            configure_memory(int(value))
+        elif name == "threads":
+            # The search is single-threaded (pure Python under the GIL); accepted for tool compatibility
+            self.threads = int(value)
+        elif name == "multipv":
+            self.multipv = max(1, int(value))
+        elif name == "ownbook":
+            self.own_book = value.lower() == "true"
+            self._configure_book()
+        elif name == "bookfile":
+            self.book_file = value
+            self._configure_book()
+        elif name == "syzygypath":
+            configure_tablebases(value.split(os.pathsep) if value else [])
+        elif name == "searchstats":
+            self.search_stats = value.lower() == "true"
+        elif name != "ponder":
+            self.send(f"info string unknown option {name}")
+
+    def _configure_book(self):
+        if not self.own_book:
+            configure_opening_book(paths=[])
+        else:
+            configure_opening_book(paths=[self.book_file] if self.book_file else None)
+
+    def ucinewgame(self):
+        self.stop()
+        search.clear_search_state()
+
+    def position(self, tokens: list[str]):
+        # position (startpos | fen <fen>) [moves <m1> ...]
+        moves = []
+        if "moves" in tokens:
+            split = tokens.index("moves")
+            tokens, moves = tokens[:split], tokens[split + 1:]
+        if tokens and tokens[0] == "fen":
+            state = GameState(" ".join(tokens[1:]))
+        else:
+            state = GameState()
+        for uci in moves:
+            try:
+                move = chess.Move.from_uci(uci)
+            except ValueError:
+                move = None
+            if move is None or not state.board.is_legal(move):
+                # Keep the moves before it rather than play on from a corrupted board
+                self.send(f"info string illegal move {uci} in position, ignoring the rest")
+                break
+            state.make_move(move)
+        self.state = state
+
+    def go(self, tokens: list[str]):
+        self.stop()
+        load_kpk_bitbase()  # no-op after "isready"; otherwise done before the clock starts
+        params = parse_go(tokens)
+        hold = params.get("infinite") or params.get("ponder")
+        time_manager = None if hold else allocate_time(params, self.state.board.turn)
+        self._ponder_time = allocate_time(params, self.state.board.turn) if params.get("ponder") else None
+
+        self._release.clear()
+        if not hold:
+            self._release.set()
+        self._stop = search.StopToken()
+
+        state = GameState(self.state.board.root().fen())
+        for move in self.state.board.move_stack:
+            state.make_move(move)
+        depth = min(params.get("depth", search.MAX_DEPTH), search.MAX_DEPTH)
+        self._thread = threading.Thread(target=self._search,
+                                        args=(state, depth, time_manager, params.get("nodes"), self._stop, self.multipv,
+                                              params.get("mate")),
+                                        daemon=True)
+        self._thread.start()
+
+    def _search(self, state: GameState, depth: int, time_manager, node_limit, stop: search.StopToken,
+                multipv: int, mate: int = None):
+        stats = search.SearchStats() if self.search_stats else None
+        profiler = contextlib.nullcontext()
+        if self.profile_dir:
+            from src.profiling import SearchProfiler  # cProfile/pstats only when profiling
+            self.profiled_searches += 1
+            profiler = SearchProfiler(self.profile_dir, f"go-{self.profiled_searches:03d}", report=None)
+        try:
+            with profiler:
+                if multipv > 1:
+                    lines = search.find_best_move(state, depth, node_limit=node_limit, stop=stop,
+                                                  info_callback=self._send_info, multipv=multipv,
+                                                  time_manager=time_manager, stats=stats, mate=mate)
+                    move = lines[0].move if lines else None
+                else:
+                    move = search.find_best_move(state, depth, node_limit=node_limit, stop=stop,
+                                                 info_callback=self._send_info, time_manager=time_manager, stats=stats,
+                                                 mate=mate)
+                ponder = search.get_ponder_move(state.board, move)
+            if self.profile_dir:
+                self.send(f"info string profile written to {profiler.out_dir}/{profiler.name}.*")
+        except Exception as e:
+            self.send(f"info string search failed: {e}")
+            move = ponder = None
+        # UCI: after "go infinite"/"go ponder" bestmove is only sent after "stop" or "ponderhit"
+        self._release.wait()
+        if move is None:
+            self.send("bestmove 0000")
+        elif ponder is None:
+            self.send(f"bestmove {move.uci()}")
+        else:
+            self.send(f"bestmove {move.uci()} ponder {ponder.uci()}")
+
+    def _send_info(self, info: search.SearchInfo):
+        self.send(info.uci())
+        if info.stats is not None and info.multipv <= 1:
+            self.send(f"info string stats {info.stats.summary()}")
+
+    def ponderhit(self):
+        if self._thread is None or self._release.is_set():
+            return
+        if self._ponder_time is not None:
+            search.start_clock(self._ponder_time)
+        self._release.set()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._release.set()
+        self._thread.join()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+
+    def handle(self, line: str) -> bool:
+        """Run one command line. Returns False on 'quit'."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.uci()
+        elif command == "isready":
+            # One-off setup belongs here rather than in the first timed search
+            load_kpk_bitbase()
+            self.send("readyok")
+        elif command == "setoption":
+            self.setoption(args)
+        elif command == "ucinewgame":
+            self.ucinewgame()
+        elif command == "position":
+            self.position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "memory":
+            # Non-standard: resident bytes of every cache
+            for report_line in format_report(memory_report()).splitlines():
+                self.send(f"info string {report_line}")
+        elif command == "quit":
+            self.stop()
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI chess engine (commands on stdin).")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="profile every search into DIR/go-NNN.{pstats,collapsed,json}")
+    args = parser.parse_args(argv)
+
+    # Everything written to stdout goes through UciOutput so it stays valid UCI;
+    # engine log messages (book move, search stopped, ...) become "info string" lines
+    sys.stdout = UciOutput(sys.__stdout__)
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+    configure_memory(DEFAULT_MEMORY_MB)
+    engine = UciEngine(sys.stdout, profile_dir=args.profile)
+    for line in sys.stdin:
+        try:
+            if not engine.handle(line):
+                break
+        except (ValueError, IndexError) as e:
+            engine.send(f"info string error: {e}")
+    engine.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import mmap
+import os
+import struct
+
+# ==============================================================================
+# PERSISTENT ANALYSIS CACHE
+# A fixed-size, memory-mapped file of 16-byte records keyed by Zobrist hash.
+# It keeps completed root/PV results between runs and between processes.
+#
+# Record: check (u64) | data (u64), with check = key ^ data. A reader only accepts
+# a record whose check matches, so a torn or concurrent write shows up as a miss
+# instead of garbage. Any number of processes can read (and write) without locks.
+#
+# data: move (16 bits) | depth (8) << 16 | flag (2) << 24 | score + SCORE_OFFSET (32) << 32
+# ==============================================================================
+
+MAGIC = b"CBAC0001"
+HEADER = struct.Struct("<8sQ")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<QQ")
+SCORE_OFFSET = 1 << 31
+DEFAULT_SIZE_MB = 64
+ANALYSIS_CACHE_ENV = "ANALYSIS_CACHE_PATH"
+
+
+def pack_data(depth: int, flag: int, score: int, move: int) -> int:
+    return (move & 0xFFFF) | ((depth & 0xFF) << 16) | ((flag & 0x3) << 24) | ((score + SCORE_OFFSET) << 32)
+
+
+def unpack_data(data: int) -> tuple[int, int, int, int]:
+    """(depth, flag, score, move)"""
+    return (data >> 16) & 0xFF, (data >> 24) & 0x3, (data >> 32) - SCORE_OFFSET, data & 0xFFFF
+
+
+class AnalysisCache:
+    """Memory-mapped, direct-mapped table of (depth, bound, score, best move) records."""
+
+    def __init__(self, path: str, size_mb: int = DEFAULT_SIZE_MB, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        exists = os.path.exists(path)
+        if not exists and readonly:
+            raise FileNotFoundError(path)
+        if not exists:
+            slots = max(1, (size_mb << 20) // RECORD.size)
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, slots).ljust(HEADER_SIZE, b"\0"))
+                f.truncate(HEADER_SIZE + slots * RECORD.size)
+
+        self._file = open(path, "rb" if readonly else "r+b")
+        access = mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+        self._map = mmap.mmap(self._file.fileno(), 0, access=access)
+        magic, self.slots = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) < HEADER_SIZE + self.slots * RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an analysis cache file")
+
+    def _offset(self, key: int) -> int:
+        return HEADER_SIZE + (key % self.slots) * RECORD.size
+
+    def probe(self, key: int):
+        """(depth, flag, score, move) for the position, or None."""
+        check, data = RECORD.unpack_from(self._map, self._offset(key))
+        if data == 0 or check ^ data != key:
+            return None
+        return unpack_data(data)
+
+    def store(self, key: int, depth: int, flag: int, score: int, move: int):
+        """Write a result unless the slot already holds a deeper one for the same position."""
+        if self.readonly:
+            return
+        offset = self._offset(key)
+        check, old = RECORD.unpack_from(self._map, offset)
+        if old and check ^ old == key and unpack_data(old)[0] > depth:
+            return
+        data = pack_data(depth, flag, score, move)
+        RECORD.pack_into(self._map, offset, key ^ data, data)
+
+    def flush(self):
+        if not self.readonly:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self.flush()
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+_cache = None
+_configured = False
+
+
+def open_analysis_cache(path, size_mb: int = DEFAULT_SIZE_MB, readonly: bool = False):
+    """Open (or with path=None, disable) the process-wide analysis cache."""
+    global _cache, _configured
+    if _cache is not None:
+        _cache.close()
+    _cache = AnalysisCache(path, size_mb, readonly) if path else None
+    _configured = True
+    return _cache
+
+
+def get_analysis_cache():
+    """The process-wide cache, or None. Opened from ANALYSIS_CACHE_PATH on first use if set."""
+    if not _configured:
+        open_analysis_cache(os.environ.get(ANALYSIS_CACHE_ENV) or None)
+    return _cache
@@ -0,0 +1,242 @@
+"""
+Analyse every position of PGN games or EPD files in parallel.
+
+    python -m src.batch games.pgn tests.epd -o results.jsonl --depth 4 --workers 4
+    python -m src.batch games.pgn -o results.jsonl --nodes 20000 --resume
+    python -m src.batch tests.epd -o baseline.jsonl --nodes 20000 --deterministic
+    python -m src.batch tests.epd -o out.jsonl --depth 3 --profile prof/   # profiled, in-process
+
+Positions are streamed from the inputs in order and searched on a process pool
+with a fixed depth, node or time budget. One JSON line is written per position,
+in input order, so an interrupted run can be continued with --resume: complete
+lines already in the output are kept and their positions are skipped.
+With --deterministic (depth or node budgets only) every result, node count
+included, is reproducible run to run and can be diffed exactly.
+With --stats each line also carries the search counters (see SearchStats).
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+
+import chess
+import chess.pgn
+
+from .board import GameState
+from .book import configure_opening_book
+from .endgame import load_kpk_bitbase
+from .memory import DEFAULT_MEMORY_MB, configure_memory
+from .search import MAX_DEPTH, SearchStats, find_best_move, clear_search_state, format_score
+from . import search
+
+
+# ==============================================================================
+# INPUT
+# ==============================================================================
+
+def iter_epd_positions(path: str):
+    """Yield (source, fen) for every EPD line; the source uses the 'id' opcode when present."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            board, ops = chess.Board.from_epd(line)
+            name = ops.get("id")
+            yield (f"{path}:{line_no}" + (f" {name}" if name else "")), board.fen()
+
+
+def iter_pgn_positions(path: str, min_ply: int = 0, max_ply: int = None):
+    """Yield (source, fen) for each mainline position (before the move of that ply) of every game."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        game_no = 0
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            game_no += 1
+            board = game.board()
+            moves = list(game.mainline_moves())
+            last = len(moves) if max_ply is None else min(len(moves), max_ply)
+            for ply in range(last + 1):
+                # The final position is only worth a search if the game did not end there
+                if ply >= min_ply and (ply < len(moves) or not board.is_game_over()):
+                    yield f"{path}:game {game_no} ply {ply}", board.fen()
+                if ply < len(moves):
+                    board.push(moves[ply])
+
+
+def iter_positions(paths, min_ply: int = 0, max_ply: int = None):
+    """Yield (index, source, fen) over all inputs; .epd files are read as EPD, anything else as PGN."""
+    index = 0
+    for path in paths:
+        if path.lower().endswith(".epd"):
+            positions = iter_epd_positions(path)
+        else:
+            positions = iter_pgn_positions(path, min_ply, max_ply)
+        for source, fen in positions:
+            yield index, source, fen
+            index += 1
+
+
+# ==============================================================================
+# WORKERS
+# ==============================================================================
+
+_limits = None
+
+
+def init_worker(limits: dict, hash_mb: int, use_book: bool):
+    global _limits
+    _limits = limits
+    configure_memory(hash_mb)
+    load_kpk_bitbase()
+    if not use_book:
+        configure_opening_book(paths=[])
+
+
+def analyse_position(task) -> dict:
+    """Worker: search one position with the configured budget."""
+    index, source, fen = task
+    result = {"index": index, "source": source, "fen": fen}
+    infos = []
+    # Every position starts from an empty TT so results do not depend on scheduling
+    clear_search_state()
+    start = time.perf_counter()
+    multipv = _limits["multipv"]
+    stats = SearchStats() if _limits["stats"] else None
+    try:
+        found = find_best_move(GameState(fen), _limits["depth"], _limits["time"], node_limit=_limits["nodes"],
+                               info_callback=infos.append, multipv=multipv if multipv > 1 else None,
+                               deterministic=_limits["deterministic"], stats=stats)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    move = found if multipv == 1 else (found[0].move if found else None)
+    result["move"] = move.uci() if move else None
+    if infos:
+        # In MultiPV mode the first line of the last depth is the best one
+        best = infos[-len(found)] if multipv > 1 and found else infos[-1]
+        kind, value = format_score(best.score)
+        result["score"] = {kind: value}
+        result["depth"] = best.depth
+        result["pv"] = [m.uci() for m in best.pv]
+        if multipv > 1:
+            result["lines"] = [line.to_dict() for line in found]
+    else:
+        # Book, tablebase or no legal move: no search iteration was run
+        result["score"] = None
+        result["depth"] = 0
+    result["nodes"] = search.position_count
+    result["time_ms"] = int((time.perf_counter() - start) * 1000)
+    if stats is not None:
+        result["stats"] = stats.to_dict()
+    return result
+
+
+# ==============================================================================
+# OUTPUT / RESUME
+# ==============================================================================
+
+def completed_results(path: str) -> int:
+    """Number of complete result lines at the start of an existing output file.
+
+    A trailing partial line (interrupted write) is cut off so appending can continue.
+    """
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    good_size = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record.get("index") != count:
+                break
+            count += 1
+            good_size += len(line)
+    if good_size != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_size)
+    return count
+
+
+def run_batch(inputs, output: str, depth: int = None, nodes: int = None, movetime: int = None,
+              workers: int = None, resume: bool = False, hash_mb: int = DEFAULT_MEMORY_MB,
+              use_book: bool = False, min_ply: int = 0, max_ply: int = None, multipv: int = 1,
+              deterministic: bool = False, stats: bool = False) -> int:
+    """Analyse all positions and write JSON lines in input order. Returns the number written."""
+    limits = {"depth": depth or MAX_DEPTH, "nodes": nodes, "time": movetime / 1000 if movetime else None,
+              "multipv": multipv, "deterministic": deterministic, "stats": stats}
+    skip = completed_results(output) if resume else 0
+    tasks = (task for task in iter_positions(inputs, min_ply, max_ply) if task[0] >= skip)
+
+    written = 0
+    with open(output, "a" if resume else "w", encoding="utf-8") as out:
+        if workers == 1:
+            init_worker(limits, hash_mb, use_book)
+            results = map(analyse_position, tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(limits, hash_mb, use_book))
+            results = pool.imap(analyse_position, tasks)
+        try:
+            for result in results:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                written += 1
+        finally:
+            if pool is not None:
+                pool.terminate()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse PGN/EPD positions on a process pool, one JSON line each.")
+    parser.add_argument("inputs", nargs="+", help="PGN or .epd files")
+    parser.add_argument("-o", "--output", required=True, help="JSON-lines output file")
+    parser.add_argument("--depth", type=int, default=None, help="fixed search depth")
+    parser.add_argument("--nodes", type=int, default=None, help="node budget per position")
+    parser.add_argument("--movetime", type=int, default=None, help="time budget per position (ms)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--resume", action="store_true", help="keep complete results in the output and continue")
+    parser.add_argument("--hash", type=int, default=DEFAULT_MEMORY_MB,
+                        help="memory budget MB per worker, shared by all caches (src/memory.py)")
+    parser.add_argument("--book", action="store_true", help="answer from the opening book when possible")
+    parser.add_argument("--multipv", type=int, default=1, help="also report the N best moves of each position")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="reproducible results: no clock, fresh tables, fixed book seed")
+    parser.add_argument("--stats", action="store_true", help="add the search counters to every result")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="profile the analysis into DIR (batch.*); runs in this process")
+    parser.add_argument("--min-ply", type=int, default=0, help="PGN: skip positions before this ply")
+    parser.add_argument("--max-ply", type=int, default=None, help="PGN: skip positions after this ply")
+    args = parser.parse_args(argv)
+    if not (args.depth or args.nodes or args.movetime):
+        parser.error("give at least one of --depth, --nodes or --movetime")
+    if args.deterministic and args.movetime:
+        parser.error("--deterministic ignores the clock; use --depth or --nodes")
+
+    # The profiler only sees this process: with --profile every position is searched here
+    workers = 1 if args.profile else args.workers
+    profiler = contextlib.nullcontext()
+    if args.profile:
+        from .profiling import SearchProfiler  # cProfile/pstats only when profiling
+        profiler = SearchProfiler(args.profile, "batch")
+
+    start = time.perf_counter()
+    with profiler:
+        n = run_batch(args.inputs, args.output, args.depth, args.nodes, args.movetime, workers,
+                      args.resume, args.hash, args.book, args.min_ply, args.max_ply, args.multipv,
+                      args.deterministic, args.stats)
+    print(f"Analysed {n} positions in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Search benchmark: a fixed set of positions searched to a fixed depth.
+
+    python -m src.bench                                     # depth 2, at most 5000 nodes per position
+    python -m src.bench --depth 4 --nodes 0 --json bench.json   # no node cap; save the results
+    python -m src.bench --baseline bench.json               # exit 1 on a regression
+    python -m src.bench --positions 5 --profile prof/       # cProfile + sampled stacks (src/profiling.py)
+    python -m src.bench --positions 0 --startup             # only the cold-start times
+
+Every position is searched with deterministic=True (fresh tables, no clock, no book,
+no tablebases), so the node counts only change when the search itself changes. Their
+sum is the bench signature. Tactical positions can blow up in the quiescence search,
+so each search is also capped at --nodes (deterministic as well). Per position it
+reports nodes, time, NPS, TT hit rate, static evaluations and evaluation cache hits,
+the share of quiescence nodes, the fail-high-on-first-move rate and the branching
+factor of the last iteration.
+
+Against a baseline the run fails when the total NPS drops by more than
+--max-nps-drop percent, when the node count grows by more than --max-node-increase
+percent, or, with --require-signature, when the signature changes at all.
+
+--startup also times fresh interpreters: bare Python, importing python-chess,
+src.search, main.py and ui.py, and a full UCI handshake (uci / isready / quit)
+with main.py, plus the self import time of every src module. These are the costs
+a short-lived worker process pays before its first search. They are compared
+with a baseline but never fail the run (process start-up is too noisy for that).
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+from .board import GameState
+from .book import configure_opening_book
+from .endgame import load_kpk_bitbase
+from .search import DEFAULT_HASH_MB, SearchStats, find_best_move, set_hash_size, format_score
+from .tablebase import configure_tablebases
+
+BENCH_VERSION = 1
+DEFAULT_BENCH_DEPTH = 2
+DEFAULT_BENCH_NODES = 5000
+DEFAULT_MAX_NPS_DROP = 10.0
+DEFAULT_MAX_NODE_INCREASE = 5.0
+DEFAULT_STARTUP_REPEAT = 5
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Name -> statement run by a fresh interpreter (python -c) in the repository root
+STARTUP_IMPORTS = {
+    "python": "pass",
+    "chess": "import chess",
+    "src.search": "import src.search",
+    "main": "import main",
+    "ui": "import ui",
+}
+UCI_HANDSHAKE = "uci\nisready\nquit\n"
+
+# Openings, middlegames (quiet and tactical) and endgames
+BENCH_FENS = (
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11",
+    "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+    "rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14",
+    "r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14",
+    "r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15",
+    "r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13",
+    "r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16",
+    "4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17",
+    "2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11",
+    "r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16",
+    "3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22",
+    "r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18",
+    "4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22",
+    "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26",
+    "6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/3N4 b - - 0 1",
+    "3b4/5kp1/1p1p1p1p/pP1PpP1P/P1P1P3/3KN3/8/8 w - - 0 1",
+    "2K5/p7/7P/5pR1/8/5k2/r7/8 w - - 0 1",
+    "8/6pk/1p6/8/PP3p1p/5P2/4KP1q/3Q4 w - - 0 1",
+    "7k/3p2pp/4q3/8/4Q3/5Kp1/P6b/8 w - - 0 1",
+    "8/2p5/8/2kPKp1p/2p4P/2P5/3P4/8 w - - 0 1",
+    "8/1p3pp1/7p/5P1P/2k3P1/8/2K2P2/8 w - - 0 1",
+    "8/pp2r1k1/2p1p3/3pP2p/1P1P1P1P/P5KR/8/8 w - - 0 1",
+    "8/3p4/p1bk3p/Pp6/1Kp1PpPp/2P2P1P/2P5/5B2 b - - 0 1",
+    "5k2/7R/4P2p/5K2/p1r2P1p/8/8/8 b - - 0 1",
+    "6k1/6p1/P6p/r1N5/5p2/7P/1b3PP1/4R1K1 w - - 0 1",
+    "1r3k2/4q3/2Pp3b/3Bp3/2Q2p2/1p1P2P1/1P2KP2/3N4 w - - 0 1",
+    "6k1/4pp1p/3p2p1/P1pPb3/R7/1r2P1PP/3B1P2/6K1 w - - 0 1",
+    "8/3p3B/5p2/5P2/p7/PP5b/k7/6K1 w - - 0 1",
+    "5rk1/q6p/2p3bR/1pPp1rP1/1P1Pp3/P3B1Q1/1K3P2/R7 w - - 93 90",
+    "4rrk1/1p1nq3/p7/2p1P1pp/3P2bp/3Q1Bn1/PPPB4/1K2R1NR w - - 40 21",
+    "r3k2r/3nnpbp/q2pp1p1/p7/Pp1PPPP1/4BNN1/1P5P/R2Q1RK1 w kq - 0 16",
+    "3Qb1k1/1r2ppb1/pN1n2q1/Pp1Pp1Pr/4P2p/4BP2/4B1R1/1R5K b - - 11 40",
+    "4k3/3q1r2/1N2r1b1/3ppN2/2nPP3/1B1R2n1/2R1Q3/3K4 w - - 5 1",
+    "8/8/8/5N2/8/p7/8/2NK3k w - - 0 1",
+    "8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1",
+    "8/2p4P/8/kr6/6R1/8/8/1K6 w - - 0 1",
+    "8/8/3P3k/8/1p6/8/1P6/1K3n2 b - - 0 1",
+    "8/R7/2q5/8/6k1/8/1P5p/K6R w - - 0 124",
+    "6k1/3b3r/1p1p4/p1n2p2/1PPNpP1q/P3Q1p1/1R1RB1P1/5K2 b - - 0 1",
+    "r2r1n2/pp2bk2/2p1p2p/3q4/3PN1QP/2P3R1/P4PP1/5RK1 w - - 0 1",
+)
+
+
+# ==============================================================================
+# RUN
+# ==============================================================================
+
+def bench_position(fen: str, depth: int, node_limit: int = None) -> dict:
+    """Search one position and collect its counters."""
+    infos = []
+    stats = SearchStats()
+    start = time.perf_counter()
+    move = find_best_move(GameState(fen), depth, node_limit=node_limit, info_callback=infos.append, deterministic=True,
+                          stats=stats)
+    elapsed = time.perf_counter() - start
+
+    nodes = stats.nodes
+    # Nodes of the last iteration over those of the one before (iterations report cumulative counts)
+    iteration_nodes = [infos[0].nodes] + [b.nodes - a.nodes for a, b in zip(infos, infos[1:])] if infos else []
+    branching = iteration_nodes[-1] / iteration_nodes[-2] if len(iteration_nodes) > 1 and iteration_nodes[-2] else None
+    score = format_score(infos[-1].score) if infos else None
+    return {
+        "fen": fen,
+        "move": move.uci() if move else None,
+        "score": {score[0]: score[1]} if score else None,
+        "depth": infos[-1].depth if infos else 0,
+        "nodes": nodes,
+        "time_ms": round(elapsed * 1000, 1),
+        "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+        "tt_probes": stats.tt_probes,
+        "tt_hit_rate": round(stats.tt_hit_rate, 4),
+        "eval_calls": stats.eval_calls,
+        "eval_cache_hits": stats.eval_cache_hits,
+        "qsearch_share": round(stats.qsearch_nodes / nodes, 4) if nodes else 0.0,
+        "beta_cutoffs": stats.beta_cutoffs,
+        "fail_high_first_rate": round(stats.fail_high_first_rate, 4),
+        "branching_factor": round(branching, 2) if branching else None,
+    }
+
+
+def run_bench(depth: int = DEFAULT_BENCH_DEPTH, nodes: int = DEFAULT_BENCH_NODES, fens=BENCH_FENS,
+              hash_mb: int = DEFAULT_HASH_MB, report=print) -> dict:
+    """Search every position and return the per-position results and the totals."""
+    # Only the search is measured: no book or tablebase shortcuts
+    configure_opening_book(paths=[])
+    configure_tablebases([])
+    set_hash_size(hash_mb)
+    # One-off setup (generating the KPK bitbase on a fresh install) must not land in a timed search
+    load_kpk_bitbase()
+
+    positions = []
+    for i, fen in enumerate(fens, 1):
+        result = bench_position(fen, depth, nodes or None)
+        positions.append(result)
+        report(f"{i:3d}/{len(fens)} {result['move'] or '-':6s} nodes {result['nodes']:8d} "
+               f"time {result['time_ms']:8.1f}ms nps {result['nps']:6d} tt {result['tt_hit_rate']:.2f} "
+               f"q {result['qsearch_share']:.2f} bf {result['branching_factor'] or 0:.2f}")
+
+    total_nodes = sum(p["nodes"] for p in positions)
+    seconds = sum(p["time_ms"] for p in positions) / 1000
+    probes = sum(p["tt_probes"] for p in positions)
+    cutoffs = sum(p["beta_cutoffs"] for p in positions)
+    factors = [p["branching_factor"] for p in positions if p["branching_factor"]]
+    total = {
+        "signature": total_nodes,
+        "nodes": total_nodes,
+        "time_ms": round(seconds * 1000, 1),
+        "nps": int(total_nodes / seconds) if seconds > 0 else 0,
+        "tt_hit_rate": round(sum(p["tt_hit_rate"] * p["tt_probes"] for p in positions) / probes, 4) if probes else 0.0,
+        "eval_calls": sum(p["eval_calls"] for p in positions),
+        "eval_cache_hits": sum(p["eval_cache_hits"] for p in positions),
+        "qsearch_share": round(sum(p["qsearch_share"] * p["nodes"] for p in positions) / total_nodes, 4) if total_nodes else 0.0,
+        "fail_high_first_rate": round(sum(p["fail_high_first_rate"] * p["beta_cutoffs"] for p in positions) / cutoffs,
+                                      4) if cutoffs else 0.0,
+        # Geometric mean over the positions
+        "branching_factor": round(math.exp(sum(map(math.log, factors)) / len(factors)), 2) if factors else None,
+    }
+    return {"version": BENCH_VERSION, "depth": depth, "nodes": nodes or None, "positions": positions, "total": total}
+
+
+# ==============================================================================
+# STARTUP
+# ==============================================================================
+
+def time_process(args: list, stdin: str = None, repeat: int = DEFAULT_STARTUP_REPEAT):
+    """Best wall time (ms) of running a fresh process to completion, or None if it fails."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        done = subprocess.run(args, input=stdin, capture_output=True, text=True, cwd=ROOT_DIR)
+        elapsed = (time.perf_counter() - start) * 1000
+        if done.returncode != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1)
+
+
+def import_breakdown(module: str = "src.search") -> dict:
+    """Self import time (us) of every src module and the python-chess total (python -X importtime)."""
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=ROOT_DIR)
+    modules = {}
+    for line in done.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[0].startswith("import time:") or "self" in parts[0]:
+            continue
+        name = parts[2].strip()
+        self_us = int(parts[0].split(":")[1])
+        key = name if name.startswith("src.") else "chess" if name.split(".")[0] == "chess" else "other"
+        modules[key] = modules.get(key, 0) + self_us
+    return modules
+
+
+def measure_startup(repeat: int = DEFAULT_STARTUP_REPEAT, report=print) -> dict:
+    """Cold-start times (ms, best of repeat) of the STARTUP_IMPORTS and of a UCI handshake."""
+    times = {name: time_process([sys.executable, "-c", statement], repeat=repeat)
+             for name, statement in STARTUP_IMPORTS.items()}
+    times["uci_handshake"] = time_process([sys.executable, "main.py"], UCI_HANDSHAKE, repeat)
+    for name, ms in times.items():
+        report(f"startup {name:14s} {'failed' if ms is None else f'{ms:8.1f}ms'}")
+    breakdown = import_breakdown()
+    for name, us in sorted(breakdown.items(), key=lambda item: -item[1]):
+        report(f"import  {name:20s} {us / 1000:8.2f}ms self")
+    return {"repeat": repeat, "times_ms": times, "import_self_us": breakdown}
+
+
+# ==============================================================================
+# BASELINE COMPARISON
+# ==============================================================================
+
+def compare_to_baseline(result: dict, baseline: dict, max_nps_drop: float = DEFAULT_MAX_NPS_DROP,
+                        max_node_increase: float = DEFAULT_MAX_NODE_INCREASE,
+                        require_signature: bool = False, report=print) -> list[str]:
+    """Print the changes against a saved run; returns the list of regressions (empty = pass)."""
+    if (baseline.get("depth"), baseline.get("nodes"), len(baseline["positions"])) != \
+            (result["depth"], result["nodes"], len(result["positions"])):
+        return [f"baseline was run with depth {baseline.get('depth')}, node cap {baseline.get('nodes')} "
+                f"on {len(baseline['positions'])} positions"]
+
+    old, new = baseline["total"], result["total"]
+    regressions = []
+
+    def change(key):
+        return (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+
+    for key in ("signature", "nps", "time_ms", "tt_hit_rate", "eval_calls", "eval_cache_hits", "qsearch_share",
+                "fail_high_first_rate", "branching_factor"):
+        if old.get(key) is not None and new.get(key) is not None:
+            report(f"{key:16s} {old[key]:>12} -> {new[key]:>12}  ({change(key):+.1f}%)")
+
+    if -change("nps") > max_nps_drop:
+        regressions.append(f"NPS dropped {-change('nps'):.1f}% (limit {max_nps_drop}%)")
+    if change("nodes") > max_node_increase:
+        regressions.append(f"nodes grew {change('nodes'):.1f}% (limit {max_node_increase}%)")
+    if require_signature and new["signature"] != old["signature"]:
+        changed = sum(a["nodes"] != b["nodes"] for a, b in zip(baseline["positions"], result["positions"]))
+        regressions.append(f"signature changed ({changed} positions searched differently)")
+
+    if "startup" in result and "startup" in baseline:
+        for name, ms in result["startup"]["times_ms"].items():
+            before = baseline["startup"]["times_ms"].get(name)
+            if ms is not None and before:
+                report(f"startup {name:8s} {before:>12} -> {ms:>12}  ({(ms - before) / before * 100:+.1f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a fixed set of positions and report speed and search shape.")
+    parser.add_argument("--depth", type=int, default=DEFAULT_BENCH_DEPTH, help="search depth per position")
+    parser.add_argument("--nodes", type=int, default=DEFAULT_BENCH_NODES, help="node cap per position (0 = none)")
+    parser.add_argument("--positions", type=int, default=None, help="only the first N positions")
+    parser.add_argument("--hash", type=int, default=DEFAULT_HASH_MB, help="transposition table MB")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="compare with a saved --json result")
+    parser.add_argument("--max-nps-drop", type=float, default=DEFAULT_MAX_NPS_DROP,
+                        help="percent of NPS the run may lose against the baseline")
+    parser.add_argument("--max-node-increase", type=float, default=DEFAULT_MAX_NODE_INCREASE,
+                        help="percent the node count may grow against the baseline")
+    parser.add_argument("--require-signature", action="store_true", help="fail if any node count changed")
+    parser.add_argument("--profile", default=None, metavar="DIR", help="profile the run into DIR (bench.*)")
+    parser.add_argument("--startup", action="store_true", help="also time cold starts and imports")
+    args = parser.parse_args(argv)
+
+    # Profiling slows the search down several times: its NPS is not comparable with plain runs
+    profiler = contextlib.nullcontext()
+    if args.profile:
+        from .profiling import SearchProfiler  # cProfile/pstats only when profiling
+        profiler = SearchProfiler(args.profile, "bench")
+    with profiler:
+        result = run_bench(args.depth, args.nodes, BENCH_FENS[:args.positions], args.hash)
+    if args.startup:
+        result["startup"] = measure_startup()
+    total = result["total"]
+    print(f"Signature {total['signature']}  time {total['time_ms'] / 1000:.2f}s  nps {total['nps']}  "
+          f"tt hits {total['tt_hit_rate']:.1%}  evals {total['eval_calls']} ({total['eval_cache_hits']} cached)  "
+          f"qsearch {total['qsearch_share']:.1%}  fail-high first {total['fail_high_first_rate']:.1%}  "
+          f"branching {total['branching_factor']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(result, baseline, args.max_nps_drop, args.max_node_increase,
+                                          args.require_signature)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
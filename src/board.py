@@ -39,4 +39,64 @@ class GameState:
         return self.board.__str__()
 
     def turn(self):
-        return self.board.turn
\ No newline at end of file
+        return self.board.turn
+
+
+# ==============================================================================
+# PSEUDO-LEGAL MOVE GENERATION WITH DEFERRED LEGALITY
+# python-chess' legal_moves filters every move before the first one is played.
+# The search instead generates pseudo-legal moves and checks each one only when
+# it is about to be made, using pin/check information computed once per node.
+# ==============================================================================
+
+def get_check_info(board: chess.Board):
+    """Return (king, slider_blockers, checkers) for the side to move, or None without a king."""
+    king = board.king(board.turn)
+    if king is None:
+        return None
+    return king, board._slider_blockers(king), board.checkers_mask()
+
+
+def generate_pseudo_legal_moves(board: chess.Board, check_info):
+    """Pseudo-legal moves; when in check only evasions are generated."""
+    if check_info is not None and check_info[2]:
+        return board._generate_evasions(check_info[0], check_info[2])
+    return board.generate_pseudo_legal_moves()
+
+
+def generate_pseudo_legal_tactical_moves(board: chess.Board, check_info):
+    """Pseudo-legal captures and promotions (quiescence moves)."""
+    if check_info is not None and check_info[2]:
+        return [move for move in board._generate_evasions(check_info[0], check_info[2])
+                if move.promotion or board.is_capture(move)]
+    moves = list(board.generate_pseudo_legal_captures())
+    promotion_targets = chess.BB_BACKRANKS & ~board.occupied
+    for move in board.generate_pseudo_legal_moves(board.pawns, promotion_targets):
+        moves.append(move)
+    return moves
+
+
+def is_safe_move(board: chess.Board, check_info, move: chess.Move) -> bool:
+    """True if a pseudo-legal move from the generators above does not leave the king in check."""
+    if check_info is None:
+        return True
+    return board._is_safe(check_info[0], check_info[1], move)
+
+
+# ==============================================================================
+# 16-BIT MOVE ENCODING
+# Inside the search moves are stored as ints: from | to << 6 | promotion << 12.
+# 0 (a1a1) never occurs as a real move and is used as "no move".
+# ==============================================================================
+
+NO_MOVE = 0
+
+
+def encode_move(move: chess.Move) -> int:
+    """Pack a chess.Move into a 16-bit int."""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    """Inverse of encode_move."""
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
@@ -0,0 +1,146 @@
+import atexit
+import os
+import random
+from collections import OrderedDict
+
+import chess
+import chess.polyglot
+
+# ==============================================================================
+# OPENING BOOK SERVICE
+# One memory-mapped reader per book file and per process, shared by every search.
+# Several books are consulted in priority order; the first one that knows the
+# position decides, and its moves are picked at random proportionally to weight.
+# ==============================================================================
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Highest priority first. Relative paths are resolved against the package directory.
+DEFAULT_BOOK_FILES = (
+    os.path.join("Cerebellum_Light_3Merge_200916", "Cerebellum3Merge.bin"),
+    "Cerebellum3Merge.bin",
+    "gm2001.bin",
+)
+
+BOOK_CACHE_SIZE = 4096
+# Approximate resident size of one lookup cache entry (OrderedDict slot + key + move list)
+BOOK_CACHE_ENTRY_BYTES = 580
+book_cache_size = BOOK_CACHE_SIZE
+
+_readers = {}
+_readers_pid = None
+
+
+def resolve_book_path(path: str) -> str:
+    """Absolute paths are kept; relative ones are taken relative to the src package."""
+    path = os.path.expanduser(path)
+    if not os.path.isabs(path):
+        path = os.path.join(PACKAGE_DIR, path)
+    return os.path.normpath(path)
+
+
+def get_reader(path: str):
+    """Return the process-wide reader for a book file, or None if the file does not exist."""
+    global _readers_pid
+    if _readers_pid != os.getpid():
+        # Forked worker: do not reuse the parent's handles
+        _readers.clear()
+        _readers_pid = os.getpid()
+    reader = _readers.get(path)
+    if reader is None:
+        if not os.path.isfile(path):
+            return None
+        reader = chess.polyglot.open_reader(path)
+        _readers[path] = reader
+    return reader
+
+
+def close_readers():
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
+
+
+atexit.register(close_readers)
+
+
+class OpeningBook:
+    """Priority-ordered set of polyglot books with a lookup cache keyed by Zobrist hash."""
+
+    def __init__(self, paths=DEFAULT_BOOK_FILES, seed=None, cache_size: int = None):
+        self.paths = [resolve_book_path(p) for p in paths]
+        self.rng = random.Random(seed)
+        self.cache_size = book_cache_size if cache_size is None else cache_size
+        self._cache = OrderedDict()
+
+    def entries(self, board: chess.Board) -> list[tuple[chess.Move, int]]:
+        """Legal (move, weight) pairs from the highest-priority book that has the position."""
+        key = chess.polyglot.zobrist_hash(board)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        found = []
+        for path in self.paths:
+            reader = get_reader(path)
+            if reader is None:
+                continue
+            found = [(entry.move, entry.weight) for entry in reader.find_all(board)]
+            if found:
+                break
+
+        self._cache[key] = found
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return found
+
+    def choose(self, board: chess.Board, rng: random.Random = None):
+        """Weighted random book move for the position, or None when out of book.
+
+        rng replaces the book's own generator for this call (e.g. a seeded one for a
+        reproducible pick that leaves later picks random).
+        """
+        entries = self.entries(board)
+        if not entries:
+            return None
+        moves = [move for move, _ in entries]
+        weights = [weight for _, weight in entries]
+        return (rng or self.rng).choices(moves, weights=weights)[0]
+
+    def seed(self, seed):
+        self.rng.seed(seed)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def resize_cache(self, cache_size: int):
+        self.cache_size = cache_size
+        while len(self._cache) > cache_size:
+            self._cache.popitem(last=False)
+
+
+_book = None
+
+
+def get_opening_book() -> OpeningBook:
+    """The process-wide book, created with the default files on first use."""
+    global _book
+    if _book is None:
+        _book = OpeningBook()
+    return _book
+
+
+def set_book_cache_size(size_mb: float):
+    """Bound the lookup cache of the process-wide book (and of books created later) to about size_mb."""
+    global book_cache_size
+    book_cache_size = int(size_mb * (1 << 20)) // BOOK_CACHE_ENTRY_BYTES
+    if _book is not None:
+        _book.resize_cache(book_cache_size)
+
+
+def configure_opening_book(paths=None, seed=None) -> OpeningBook:
+    """Replace the process-wide book, e.g. with user-supplied files or a fixed seed."""
+    global _book
+    _book = OpeningBook(DEFAULT_BOOK_FILES if paths is None else paths, seed=seed)
+    return _book
@@ -0,0 +1,217 @@
+"""
+Build a polyglot opening book (.bin) from local PGN files.
+
+    python -m src.book_builder games/*.pgn -o src/mybook.bin --max-ply 20 --workers 4
+
+Every file is split into byte ranges that are counted in parallel on a process
+pool. Games are streamed one at a time, so memory only grows with the number of
+distinct (position, move) pairs seen up to --max-ply.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import struct
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+# Polyglot entry: key (8) | move (2) | weight (2) | learn (4), big endian
+ENTRY_STRUCT = struct.Struct(">QHHI")
+MAX_WEIGHT = 0xFFFF
+
+DEFAULT_MAX_PLY = 20
+DEFAULT_CHUNK_MB = 32
+
+# Index of each counter in the per-move stats lists
+GAMES, WINS, DRAWS = 0, 1, 2
+
+
+# ==============================================================================
+# PGN STREAMING
+# ==============================================================================
+
+def _is_game_start(line: bytes, previous: bytes) -> bool:
+    # A game starts with a tag line at the top of the file or right after a blank line.
+    # The same rule is used to cut byte ranges, so every game is counted exactly once.
+    return line.startswith(b"[") and not previous.strip()
+
+
+def _previous_line_is_blank(f, position: int) -> bool:
+    if position == 0:
+        return True
+    f.seek(max(0, position - 3))
+    tail = f.read(position - max(0, position - 3))
+    return tail.endswith(b"\n\n") or tail.endswith(b"\n\r\n") or tail in (b"\n", b"\r\n")
+
+
+def iter_games_in_range(path: str, start: int, end: int):
+    """Yield the PGN text of every game whose first tag line starts in [start, end)."""
+    with open(path, "rb") as f:
+        if start > 0:
+            # Move to the first full line at or after start
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        position = f.tell()
+        previous = b"" if _previous_line_is_blank(f, position) else b"-"
+        f.seek(position)
+
+        lines = []
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if offset == 0 and line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+            if _is_game_start(line, previous):
+                if lines:
+                    yield b"".join(lines).decode("utf-8", errors="replace")
+                    lines = []
+                if offset >= end:
+                    break
+                lines.append(line)
+            elif lines:
+                lines.append(line)
+            previous = line
+        if lines:
+            yield b"".join(lines).decode("utf-8", errors="replace")
+
+
+def polyglot_move(board: chess.Board, move: chess.Move) -> int:
+    """Raw polyglot move; castling is stored as king-takes-rook."""
+    if board.is_castling(move):
+        move = board._to_chess960(move)
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.to_square | (move.from_square << 6) | (promotion << 12)
+
+
+def count_game(text: str, max_ply: int, counts: dict):
+    """Add the moves of one PGN game to counts[(zobrist_key, raw_move)]."""
+    game = chess.pgn.read_game(io.StringIO(text))
+    if game is None or game.errors:
+        return
+    result = game.headers.get("Result", "*")
+    if result == "1-0":
+        white_score = 2
+    elif result == "0-1":
+        white_score = 0
+    elif result == "1/2-1/2":
+        white_score = 1
+    else:
+        return
+
+    board = game.board()
+    for ply, move in enumerate(game.mainline_moves()):
+        if ply >= max_ply:
+            break
+        key = (chess.polyglot.zobrist_hash(board), polyglot_move(board, move))
+        stats = counts.get(key)
+        if stats is None:
+            stats = counts[key] = [0, 0, 0]
+        stats[GAMES] += 1
+        score = white_score if board.turn == chess.WHITE else 2 - white_score
+        if score == 2:
+            stats[WINS] += 1
+        elif score == 1:
+            stats[DRAWS] += 1
+        board.push(move)
+
+
+def count_range(task) -> dict:
+    """Worker: count one byte range of one PGN file."""
+    path, start, end, max_ply = task
+    counts = {}
+    for text in iter_games_in_range(path, start, end):
+        count_game(text, max_ply, counts)
+    return counts
+
+
+def split_tasks(paths, max_ply: int, chunk_bytes: int) -> list:
+    tasks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), chunk_bytes):
+            tasks.append((path, start, min(size, start + chunk_bytes), max_ply))
+    return tasks
+
+
+# ==============================================================================
+# BOOK OUTPUT
+# ==============================================================================
+
+def merge_counts(total: dict, part: dict):
+    for key, stats in part.items():
+        merged = total.get(key)
+        if merged is None:
+            total[key] = stats
+        else:
+            merged[GAMES] += stats[GAMES]
+            merged[WINS] += stats[WINS]
+            merged[DRAWS] += stats[DRAWS]
+
+
+def build_entries(counts: dict, min_games: int = 1) -> list[tuple[int, int, int]]:
+    """Turn merged counts into sorted (key, move, weight) entries.
+
+    Weight is 2 * wins + draws, rescaled per position when it would overflow 16 bits.
+    """
+    by_position = {}
+    for (key, move), stats in counts.items():
+        if stats[GAMES] < min_games:
+            continue
+        weight = 2 * stats[WINS] + stats[DRAWS]
+        if weight > 0:
+            by_position.setdefault(key, []).append((move, weight))
+
+    entries = []
+    for key in sorted(by_position):
+        moves = by_position[key]
+        top = max(weight for _, weight in moves)
+        for move, weight in sorted(moves, key=lambda item: (-item[1], item[0])):
+            if top > MAX_WEIGHT:
+                weight = max(1, weight * MAX_WEIGHT // top)
+            entries.append((key, move, weight))
+    return entries
+
+
+def write_book(path: str, entries) -> int:
+    with open(path, "wb") as f:
+        for key, move, weight in entries:
+            f.write(ENTRY_STRUCT.pack(key, move, weight, 0))
+    return len(entries)
+
+
+def build_book(pgn_paths, output: str, max_ply: int = DEFAULT_MAX_PLY, min_games: int = 1,
+               workers: int = None, chunk_bytes: int = DEFAULT_CHUNK_MB << 20) -> int:
+    """Count all PGN files on a process pool and write the merged book. Returns the entry count."""
+    tasks = split_tasks(pgn_paths, max_ply, chunk_bytes)
+    counts = {}
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            merge_counts(counts, count_range(task))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for part in pool.imap_unordered(count_range, tasks):
+                merge_counts(counts, part)
+    return write_book(output, build_entries(counts, min_games))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a polyglot opening book from PGN files.")
+    parser.add_argument("pgn", nargs="+", help="PGN files to read")
+    parser.add_argument("-o", "--output", required=True, help="output .bin file")
+    parser.add_argument("--max-ply", type=int, default=DEFAULT_MAX_PLY, help="only count the first N plies of each game")
+    parser.add_argument("--min-games", type=int, default=1, help="drop moves played in fewer games")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_MB, help="byte range size per task")
+    args = parser.parse_args(argv)
+
+    n = build_book(args.pgn, args.output, args.max_ply, args.min_games, args.workers, args.chunk_mb << 20)
+    print(f"Wrote {n} entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -186,6 +186,11 @@ PHASE_VALUES = {
 
 TOTAL_PHASE = PAWNPHASE*16 +KNIGHTPHASE*4 +BISHOPPHASE*4 +ROOKPHASE*4 +QUEENPHASE*2
 
+# Tapered eval dạng fixed-point: phase được quy về thang 0..PHASE_SCALE (2^PHASE_SHIFT)
+PHASE_SHIFT = 8
+PHASE_SCALE = 1 << PHASE_SHIFT
+PHASE_WEIGHTS = [(p * PHASE_SCALE + TOTAL_PHASE // 2) // TOTAL_PHASE for p in range(TOTAL_PHASE + 1)]
+
 PST = {
     chess.PAWN: (PAWN_PST_MG, PAWN_PST_EG),
     chess.KNIGHT: (KNIGHT_PST_MG, KNIGHT_PST_EG),
@@ -229,28 +234,30 @@ BACKWARD_PAWN_PENALTY_MG = -8
 BACKWARD_PAWN_PENALTY_EG = -20
 
 # build passed pawn mask
-WHITE_PASSED_PAWN_MASKS = [chess.SquareSet() for _ in range(64)]
-BLACK_PASSED_PAWN_MASKS = [chess.SquareSet() for _ in range(64)]
+def _build_passed_pawn_masks() -> list[int]:
+    """White masks of squares 0-63, then black masks of squares 0-63."""
+    white, black = [], []
+    for square in chess.SQUARES:
+        file_index = chess.square_file(square)
+        rank_index = chess.square_rank(square)
+
+        files_mask = FILE_MASKS[file_index] | ADJACENT_FILES_MASKS[file_index]
 
-for square in chess.SQUARES:
-    file_index = chess.square_file(square)
-    rank_index = chess.square_rank(square)
+        ranks_in_front = 0
+        for r in range(rank_index + 1, 8):
+            ranks_in_front |= chess.BB_RANKS[r]
+        white.append(files_mask & ranks_in_front)
 
-    files_mask = chess.SquareSet(FILE_MASKS[file_index])
-    if file_index > 0:
-        files_mask |= FILE_MASKS[file_index - 1]
-    if file_index < 7:
-        files_mask |= FILE_MASKS[file_index + 1]
+        ranks_in_front = 0
+        for r in range(rank_index - 1, -1, -1):
+            ranks_in_front |= chess.BB_RANKS[r]
+        black.append(files_mask & ranks_in_front)
+    return white + black
 
-    ranks_in_front = chess.SquareSet()
-    for r in range(rank_index + 1, 8):
-        ranks_in_front |= chess.BB_RANKS[r]
-    WHITE_PASSED_PAWN_MASKS[square] = files_mask & ranks_in_front
 
-    ranks_in_front = chess.SquareSet()
-    for r in range(rank_index - 1, -1, -1):
-        ranks_in_front |= chess.BB_RANKS[r]
-    BLACK_PASSED_PAWN_MASKS[square] = files_mask & ranks_in_front
+_passed_pawn_masks = _build_passed_pawn_masks()
+WHITE_PASSED_PAWN_MASKS = [chess.SquareSet(mask) for mask in _passed_pawn_masks[:64]]
+BLACK_PASSED_PAWN_MASKS = [chess.SquareSet(mask) for mask in _passed_pawn_masks[64:]]
 
 ROOK_OPEN_FILES_BONUS_MG = 15
 ROOK_OPEN_FILES_BONUS_EG = 20
@@ -335,6 +342,8 @@ KNIGHT_OUTPOST_BONUS_EG = 15
 # Endgame
 PASSED_PAWN_PROMOTION_BONUS_EG = 20
 KING_ACTIVITY_BONUS_EG = 10
+# Thưởng Vua hoạt động chỉ áp dụng sau nước đi này (evaluation phụ thuộc fullmove_number)
+KING_ACTIVITY_MIN_FULLMOVE = 30
 
 
 # Tấn công các quân đối phương (piece values khi tấn công)
@@ -0,0 +1,263 @@
+import os
+
+import chess
+
+from .constant import PIECE_VALUES_EG
+
+# ==============================================================================
+# SPECIALIZED ENDGAME EVALUATION
+# Positions with few pieces are dispatched by material signature ("KRvK", "KPvK")
+# to cheap scoring functions instead of the full evaluation. Scores are integer
+# centipawns from the point of view of the side to move, like evaluate_board.
+# ==============================================================================
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+KPK_BITBASE_FILE = os.path.join(PACKAGE_DIR, "kpk.bitbase")
+
+# Signatures are only computed when this few pieces (kings included) are left
+MAX_ENDGAME_PIECES = 5
+
+# A won ending ranks above any material balance but far below mate/tablebase scores
+KNOWN_WIN = 10000
+
+SIGNATURE_ORDER = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT, chess.PAWN)
+
+
+def material_signature(board: chess.Board, color: chess.Color) -> str:
+    """Pieces of one side as a string such as 'KRP' (kings first, then Q, R, B, N, P)."""
+    sig = "K"
+    for piece_type in SIGNATURE_ORDER:
+        sig += chess.piece_symbol(piece_type).upper() * chess.popcount(board.pieces_mask(piece_type, color))
+    return sig
+
+
+# ==============================================================================
+# KPK BITBASE
+# Win/draw for every King+Pawn vs King position with the pawn side (normalized to
+# White, pawn on files a-d) and either side to move, built by retrograde analysis.
+# Index: stm | weak_king << 1 | strong_king << 7 | pawn_file << 13 | (6 - pawn_rank) << 15
+# ==============================================================================
+
+KPK_SIZE = 2 * 24 * 64 * 64
+_INVALID, _UNKNOWN, _DRAW, _WIN = 0, 1, 2, 4
+
+_kpk_bits = None
+
+
+def kpk_index(strong_to_move: bool, strong_king: int, weak_king: int, pawn: int) -> int:
+    return ((0 if strong_to_move else 1) | (weak_king << 1) | (strong_king << 7) |
+            (chess.square_file(pawn) << 13) | ((6 - chess.square_rank(pawn)) << 15))
+
+
+def _kpk_initial(stm: int, wk: int, bk: int, psq: int) -> int:
+    distance = chess.square_distance
+    if distance(wk, bk) <= 1 or wk == psq or bk == psq:
+        return _INVALID
+    if stm == 0 and chess.BB_PAWN_ATTACKS[chess.WHITE][psq] & chess.BB_SQUARES[bk]:
+        return _INVALID
+    promotion = psq + 8
+    if stm == 0 and chess.square_rank(psq) == 6 and wk != promotion and \
+            (distance(bk, promotion) > 1 or distance(wk, promotion) == 1):
+        return _WIN
+    if stm == 1:
+        bk_moves = chess.BB_KING_ATTACKS[bk]
+        guarded = chess.BB_KING_ATTACKS[wk] | chess.BB_PAWN_ATTACKS[chess.WHITE][psq]
+        if not (bk_moves & ~guarded) or (bk_moves & ~chess.BB_KING_ATTACKS[wk] & chess.BB_SQUARES[psq]):
+            return _DRAW
+    return _UNKNOWN
+
+
+def generate_kpk_bitbase() -> bytearray:
+    """Retrograde analysis of KPK; returns a bit array (1 = win for the pawn side)."""
+    king_moves = [list(chess.scan_forward(chess.BB_KING_ATTACKS[sq])) for sq in range(64)]
+    result = bytearray(KPK_SIZE)
+    unknown = []
+    for idx in range(KPK_SIZE):
+        psq = (6 - (idx >> 15)) * 8 + ((idx >> 13) & 3)
+        r = _kpk_initial(idx & 1, (idx >> 7) & 63, (idx >> 1) & 63, psq)
+        result[idx] = r
+        if r == _UNKNOWN:
+            unknown.append(idx)
+
+    changed = True
+    while changed:
+        changed = False
+        still_unknown = []
+        for idx in unknown:
+            bk = (idx >> 1) & 63
+            wk = (idx >> 7) & 63
+            pawn_bits = idx & ~0x1FFF
+            r = 0
+            if idx & 1 == 0:
+                # Strong side to move: king moves and pawn pushes lead to weak-side-to-move positions
+                base = 1 | (bk << 1) | pawn_bits
+                for to in king_moves[wk]:
+                    r |= result[base | (to << 7)]
+                rank_index = idx >> 15  # 6 - pawn rank
+                if rank_index > 0:
+                    r |= result[(idx | 1) - (1 << 15)]
+                    if rank_index == 5:
+                        push = (6 - rank_index + 1) * 8 + ((idx >> 13) & 3)
+                        if push != wk and push != bk:
+                            r |= result[(idx | 1) - (2 << 15)]
+                new = _WIN if r & _WIN else _UNKNOWN if r & _UNKNOWN else _DRAW
+            else:
+                base = (wk << 7) | pawn_bits
+                for to in king_moves[bk]:
+                    r |= result[base | (to << 1)]
+                new = _DRAW if r & _DRAW else _UNKNOWN if r & _UNKNOWN else _WIN
+            if new != _UNKNOWN:
+                result[idx] = new
+                changed = True
+            else:
+                still_unknown.append(idx)
+        unknown = still_unknown
+
+    bits = bytearray(KPK_SIZE // 8)
+    for idx in range(KPK_SIZE):
+        if result[idx] == _WIN:
+            bits[idx >> 3] |= 1 << (idx & 7)
+    return bits
+
+
+def load_kpk_bitbase(path: str = KPK_BITBASE_FILE) -> bytearray:
+    """Load the cached bitbase, generating and saving it on first use.
+
+    Generation takes over a second and cannot be interrupted, so every entry point
+    calls this at startup, before its first timed search.
+    """
+    global _kpk_bits
+    if _kpk_bits is not None:
+        return _kpk_bits
+    try:
+        with open(path, "rb") as f:
+            data = bytearray(f.read())
+        if len(data) == KPK_SIZE // 8:
+            _kpk_bits = data
+            return _kpk_bits
+    except OSError:
+        pass
+    _kpk_bits = generate_kpk_bitbase()
+    try:
+        with open(path, "wb") as f:
+            f.write(_kpk_bits)
+    except OSError:
+        pass  # read-only install: keep the in-memory copy
+    return _kpk_bits
+
+
+def kpk_probe(strong_to_move: bool, strong_king: int, weak_king: int, pawn: int) -> bool:
+    """True if the pawn side wins. Squares must be normalized to a White pawn on files a-d."""
+    idx = kpk_index(strong_to_move, strong_king, weak_king, pawn)
+    return bool(load_kpk_bitbase()[idx >> 3] & (1 << (idx & 7)))
+
+
+# ==============================================================================
+# ENDGAME EVALUATORS
+# Each takes (board, strong_color) and scores from the strong side's point of view.
+# ==============================================================================
+
+def _edge_distance(x: int) -> int:
+    return min(x, 7 - x)
+
+
+def push_to_edge(square: int) -> int:
+    """Larger the closer the square is to the edge of the board."""
+    fd = _edge_distance(chess.square_file(square))
+    rd = _edge_distance(chess.square_rank(square))
+    return 90 - (7 * fd * fd // 2 + 7 * rd * rd // 2)
+
+
+def push_to_corner(square: int) -> int:
+    """7 on a1/h8, 0 on the a8-h1 diagonal."""
+    return abs(7 - chess.square_rank(square) - chess.square_file(square))
+
+
+def push_close(a: int, b: int) -> int:
+    return 140 - 20 * chess.square_distance(a, b)
+
+
+def material_eg(board: chess.Board, color: chess.Color) -> int:
+    return sum(PIECE_VALUES_EG[pt] * chess.popcount(board.pieces_mask(pt, color)) for pt in SIGNATURE_ORDER)
+
+
+def evaluate_draw(board: chess.Board, strong: chess.Color) -> int:
+    return 0
+
+
+def evaluate_kxk(board: chess.Board, strong: chess.Color) -> int:
+    """Mating material against a bare king: drive the king to the edge, bring ours closer."""
+    bishops = board.pieces_mask(chess.BISHOP, strong)
+    if bishops == board.occupied_co[strong] & ~board.kings and \
+            (not bishops & chess.BB_LIGHT_SQUARES or not bishops & chess.BB_DARK_SQUARES):
+        return 0  # only same-coloured bishops cannot mate
+    strong_king = board.king(strong)
+    weak_king = board.king(not strong)
+    return KNOWN_WIN + material_eg(board, strong) + push_to_edge(weak_king) + push_close(strong_king, weak_king)
+
+
+def evaluate_kbnk(board: chess.Board, strong: chess.Color) -> int:
+    """Bishop and knight mate: the weak king must go to a corner of the bishop's colour."""
+    strong_king = board.king(strong)
+    weak_king = board.king(not strong)
+    if board.pieces_mask(chess.BISHOP, strong) & chess.BB_LIGHT_SQUARES:
+        # a1/h8 are dark squares; flip files so that push_to_corner aims at a8/h1
+        return KNOWN_WIN + material_eg(board, strong) + push_close(strong_king, weak_king) + \
+            60 * push_to_corner(weak_king ^ 7)
+    return KNOWN_WIN + material_eg(board, strong) + push_close(strong_king, weak_king) + \
+        60 * push_to_corner(weak_king)
+
+
+def evaluate_kpk(board: chess.Board, strong: chess.Color) -> int:
+    """King and pawn against king, decided by the KPK bitbase."""
+    strong_king = board.king(strong)
+    weak_king = board.king(not strong)
+    pawn = chess.lsb(board.pawns)
+    if strong == chess.BLACK:
+        strong_king, weak_king, pawn = strong_king ^ 56, weak_king ^ 56, pawn ^ 56
+    if chess.square_file(pawn) >= 4:
+        strong_king, weak_king, pawn = strong_king ^ 7, weak_king ^ 7, pawn ^ 7
+    if not kpk_probe(board.turn == strong, strong_king, weak_king, pawn):
+        return 0
+    return KNOWN_WIN + PIECE_VALUES_EG[chess.PAWN] + chess.square_rank(pawn)
+
+
+def _build_evaluator_table() -> dict:
+    table = {
+        "KvK": evaluate_draw,
+        "KNvK": evaluate_draw,
+        "KBvK": evaluate_draw,
+        "KNNvK": evaluate_draw,
+        "KPvK": evaluate_kpk,
+        "KBNvK": evaluate_kbnk,
+    }
+    # Every combination of up to three pieces that can force mate against a bare king
+    pieces = "QRBNP"
+    combos = {""}
+    for _ in range(3):
+        combos |= {c + p for c in combos for p in pieces}
+    for combo in combos:
+        sig = "K" + "".join(sorted(combo, key=pieces.index))
+        if ("Q" in sig or "R" in sig or sig.count("B") >= 2) and sig + "vK" not in table:
+            table[sig + "vK"] = evaluate_kxk
+    return table
+
+
+ENDGAME_EVALUATORS = _build_evaluator_table()
+
+
+def evaluate_known_endgame(board: chess.Board):
+    """Score of a known ending from the side to move's point of view, or None."""
+    if chess.popcount(board.occupied) > MAX_ENDGAME_PIECES:
+        return None
+    white = material_signature(board, chess.WHITE)
+    black = material_signature(board, chess.BLACK)
+    strong = chess.WHITE
+    evaluator = ENDGAME_EVALUATORS.get(white + "v" + black)
+    if evaluator is None:
+        strong = chess.BLACK
+        evaluator = ENDGAME_EVALUATORS.get(black + "v" + white)
+        if evaluator is None:
+            return None
+    score = evaluator(board, strong)
+    return score if board.turn == strong else -score
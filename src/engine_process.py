@@ -0,0 +1,189 @@
+"""
+The GUI's engine, in a process of its own.
+
+    engine = EngineProcess()
+    engine.start()
+    search_id = engine.search(board, depth=4, time_limit=2.0)
+    ...
+    for message in engine.poll():          # from the Tk loop, never blocks
+        ...
+
+A pure-Python search holds the GIL for its whole duration, so running it on a
+thread of the Tk process makes the GUI stutter, and a thread that does not stop
+cannot be killed. EngineProcess keeps one persistent engine process instead: its
+transposition table, heuristics, evaluation cache and opening book stay warm from
+move to move, and the GUI only exchanges small messages with it.
+
+Commands (GUI -> engine), handled in order by the engine's main thread while the
+search runs on a thread of its own:
+
+    ("search", id, root_fen, moves, depth, time_limit, ponder)
+    ("stop",)                       # the running search reports its last completed depth
+    ("ponderhit", id, time_limit)   # start the clock of ponder search id
+    ("clear",)                      # new game: forget everything learned
+    ("quit",)
+
+Messages (engine -> GUI), tagged with the search id so answers to a search the GUI
+has given up on can be dropped:
+
+    ("info", id, SearchInfo)
+    ("bestmove", id, move, ponder_move)     # chess.Move or None
+    ("error", id, message)
+
+A search that does not react to "stop" in time is ended with terminate(), which
+kills the process and starts a fresh one (the warm tables are lost).
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+
+import chess
+
+from .board import GameState
+from .endgame import load_kpk_bitbase
+from .memory import DEFAULT_MEMORY_MB, configure_memory
+from .search import StopToken, clear_search_state, find_best_move, get_ponder_move, start_clock
+from .timeman import TimeManager
+
+# Seconds quit() waits for the engine to exit before killing it
+QUIT_TIMEOUT = 2.0
+# The GUI time limit is not binding: a slow first depth may take this many times as long,
+# so the AI never plays an unsearched move
+FIRST_DEPTH_FACTOR = 2.0
+
+
+# ==============================================================================
+# ENGINE PROCESS
+# ==============================================================================
+
+def _time_manager(time_limit):
+    return TimeManager.fixed(time_limit, first_depth_factor=FIRST_DEPTH_FACTOR) if time_limit else None
+
+
+def _run_search(search_id: int, state: GameState, depth: int, time_limit, stop: StopToken, events):
+    try:
+        move = find_best_move(state, depth, stop=stop, time_manager=_time_manager(time_limit),
+                              info_callback=lambda info: events.put(("info", search_id, info)))
+        events.put(("bestmove", search_id, move, get_ponder_move(state.board, move)))
+    except Exception as e:
+        events.put(("error", search_id, f"{type(e).__name__}: {e}"))
+
+
+def engine_main(commands, events, memory_mb: int = DEFAULT_MEMORY_MB, log_level: int = None):
+    """Entry point of the engine process: serve commands until "quit"."""
+    if log_level is not None:
+        logging.basicConfig(level=log_level, format="%(message)s")
+    configure_memory(memory_mb)
+    load_kpk_bitbase()
+    running = None  # (search id, thread, stop token)
+
+    def stop_running():
+        nonlocal running
+        if running is not None:
+            running[2].set()
+            running[1].join()
+            running = None
+
+    while True:
+        command, *args = commands.get()
+        if command == "search":
+            stop_running()
+            search_id, root_fen, moves, depth, time_limit, ponder = args
+            state = GameState(root_fen)
+            for uci in moves:
+                state.make_move(chess.Move.from_uci(uci))
+            stop = StopToken()
+            # A ponder search has no clock until "ponderhit"
+            thread = threading.Thread(target=_run_search, daemon=True,
+                                      args=(search_id, state, depth, None if ponder else time_limit, stop, events))
+            thread.start()
+            running = (search_id, thread, stop)
+        elif command == "stop":
+            if running is not None:
+                running[2].set()
+        elif command == "ponderhit":
+            search_id, time_limit = args
+            if running is not None and running[0] == search_id and running[1].is_alive():
+                start_clock(_time_manager(time_limit))
+        elif command == "clear":
+            stop_running()
+            clear_search_state()
+        elif command == "quit":
+            stop_running()
+            return
+
+
+# ==============================================================================
+# GUI SIDE
+# ==============================================================================
+
+class EngineProcess:
+    """Handle on the engine process; every method returns at once."""
+
+    def __init__(self, memory_mb: int = DEFAULT_MEMORY_MB, log_level: int = None):
+        self.memory_mb = memory_mb
+        self.log_level = log_level
+        # spawn: forking a process that runs Tk is not safe on every platform
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._commands = None
+        self._events = None
+        self._next_id = 0
+
+    def start(self):
+        # Fresh queues: a killed process may leave the old ones in a broken state
+        self._commands = self._ctx.Queue()
+        self._events = self._ctx.Queue()
+        self._process = self._ctx.Process(target=engine_main, daemon=True,
+                                          args=(self._commands, self._events, self.memory_mb, self.log_level))
+        self._process.start()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def search(self, board: chess.Board, depth: int, time_limit: float = None, ponder: bool = False) -> int:
+        """Start searching board (its move history included); returns the search id."""
+        self._next_id += 1
+        root = board.root()
+        self._commands.put(("search", self._next_id, root.fen(), [move.uci() for move in board.move_stack],
+                            depth, time_limit, ponder))
+        return self._next_id
+
+    def stop(self):
+        """Ask the running search to finish; it still sends its bestmove."""
+        self._commands.put(("stop",))
+
+    def ponderhit(self, search_id: int, time_limit: float = None):
+        """The expected move was played: ponder search search_id now runs against time_limit."""
+        self._commands.put(("ponderhit", search_id, time_limit))
+
+    def new_game(self):
+        """Stop any search and forget everything learned in earlier games."""
+        self._commands.put(("clear",))
+
+    def poll(self):
+        """Yield the messages that have arrived so far."""
+        while self._events is not None:
+            try:
+                yield self._events.get_nowait()
+            except queue.Empty:
+                return
+
+    def terminate(self):
+        """Kill the process (e.g. a search ignoring stop) and start a fresh one."""
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        self.start()
+
+    def quit(self):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._commands.put(("quit",))
+            self._process.join(QUIT_TIMEOUT)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+        self._process = None
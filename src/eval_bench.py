@@ -0,0 +1,233 @@
+"""
+Cost profile of the evaluation terms.
+
+    python -m src.eval_bench                              # positions from opening-book game lines + bench set
+    python -m src.eval_bench games.pgn --max-positions 3000 --json eval_costs.json
+    python -m src.eval_bench --check-cache                # cached static_eval == evaluate_board
+
+Every term function of evaluate_board is timed on the same sample of positions
+(the best of --repeat passes, minus the cost of an empty call). For each term it
+reports microseconds per call, its share of the time of a full evaluate_board call,
+and the mean absolute score it contributes (White minus Black, phase-interpolated,
+in centipawns) as a rough measure of how much the term moves the evaluation.
+
+Only positions that reach the full evaluation are sampled: game-over positions and
+known endgames (src/endgame.py) return before any term runs.
+
+--check-cache instead evaluates every sampled position at several move numbers
+through the search's evaluation cache and fails if a cached score differs from a
+fresh evaluate_board call (the cache key must cover everything the evaluation reads).
+"""
+import argparse
+import json
+import random
+import time
+
+import chess
+
+from .batch import iter_positions
+from .bench import BENCH_FENS
+from . import search
+from .book import OpeningBook
+from .constant import KING_ACTIVITY_MIN_FULLMOVE
+from .endgame import evaluate_known_endgame
+from .evaluation import (
+    evaluate_board, get_game_phase, phase_score_calculator,
+    get_doubled_pawns_penalty, get_isolated_pawns_penalty, get_connected_pawns_bonus, get_passed_pawn_bonus,
+    get_backward_pawn_penalty, get_rook_bonus, get_double_bishop_bonus, get_knight_outpost_bonus,
+    pawn_shield_penalty, king_attack_zone_penalty, king_activity_bonus, king_attack_bonus, king_additional,
+    evaluate_attacks,
+)
+
+EVAL_BENCH_VERSION = 1
+DEFAULT_BOOK_GAMES = 200
+DEFAULT_MAX_POSITIONS = 2000
+DEFAULT_REPEAT = 3
+
+# (board, color) -> (mg, eg) terms, called once per side by evaluate_board
+COLOR_TERMS = (
+    get_doubled_pawns_penalty, get_isolated_pawns_penalty, get_connected_pawns_bonus, get_passed_pawn_bonus,
+    get_backward_pawn_penalty, get_rook_bonus, get_double_bishop_bonus, get_knight_outpost_bonus,
+    pawn_shield_penalty, king_attack_zone_penalty, king_activity_bonus, king_attack_bonus, king_additional,
+    evaluate_attacks,
+)
+# board -> value steps, called once per evaluate_board
+BOARD_STEPS = (evaluate_known_endgame, get_game_phase)
+
+
+# ==============================================================================
+# SAMPLE
+# ==============================================================================
+
+def book_positions(games: int, seed: int = 0):
+    """Positions along weighted-random lines of the bundled GM opening book."""
+    book = OpeningBook(seed=seed)
+    for _ in range(games):
+        board = chess.Board()
+        while True:
+            move = book.choose(board)
+            if move is None:
+                break
+            board.push(move)
+            yield board.fen()
+
+
+def reaches_full_eval(board: chess.Board) -> bool:
+    return not board.is_game_over(claim_draw=True) and evaluate_known_endgame(board) is None
+
+
+def sample_positions(paths=(), book_games: int = DEFAULT_BOOK_GAMES, max_positions: int = DEFAULT_MAX_POSITIONS,
+                     seed: int = 0) -> list[chess.Board]:
+    """Distinct full-eval positions from PGN/EPD files, or from book lines plus the bench set."""
+    if paths:
+        fens = (fen for _, _, fen in iter_positions(paths))
+    else:
+        fens = (fen for source in (book_positions(book_games, seed), BENCH_FENS) for fen in source)
+    seen = set()
+    boards = []
+    for fen in fens:
+        if fen in seen:
+            continue
+        seen.add(fen)
+        board = chess.Board(fen)
+        if reaches_full_eval(board):
+            boards.append(board)
+    if len(boards) > max_positions:
+        boards = random.Random(seed).sample(boards, max_positions)
+    return boards
+
+
+# ==============================================================================
+# TIMING
+# ==============================================================================
+
+def _noop(*args):
+    return None
+
+
+def time_calls(fn, calls: list, repeat: int) -> float:
+    """Best total time (ns) of calling fn(*args) for every args tuple."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for args in calls:
+            fn(*args)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def term_impact(fn, boards: list[chess.Board], phases: list[int]) -> float:
+    """Mean absolute White-minus-Black contribution of a color term, in centipawns."""
+    total = 0
+    for board, phase in zip(boards, phases):
+        white, black = fn(board, chess.WHITE), fn(board, chess.BLACK)
+        total += abs(phase_score_calculator(phase, white[0] - black[0], white[1] - black[1]))
+    return total / len(boards)
+
+
+def profile_terms(boards: list[chess.Board], repeat: int = DEFAULT_REPEAT) -> dict:
+    """Cost of every term over the sample, relative to full evaluate_board calls."""
+    board_calls = [(board,) for board in boards]
+    color_calls = [(board, color) for board in boards for color in chess.COLORS]
+    board_overhead = time_calls(_noop, board_calls, repeat)
+    color_overhead = time_calls(_noop, color_calls, repeat)
+
+    eval_ns = max(0, time_calls(evaluate_board, board_calls, repeat) - board_overhead) / len(boards)
+    phases = [get_game_phase(board) for board in boards]
+
+    terms = []
+    for fn in COLOR_TERMS:
+        ns = max(0, time_calls(fn, color_calls, repeat) - color_overhead)
+        terms.append({"name": fn.__name__, "calls_per_eval": 2, "us_per_call": ns / len(color_calls) / 1000,
+                      "mean_abs_cp": round(term_impact(fn, boards, phases), 2)})
+    for fn in BOARD_STEPS:
+        ns = max(0, time_calls(fn, board_calls, repeat) - board_overhead)
+        terms.append({"name": fn.__name__, "calls_per_eval": 1, "us_per_call": ns / len(boards) / 1000,
+                      "mean_abs_cp": None})
+
+    measured_us = 0.0
+    for term in terms:
+        term["us_per_eval"] = term["us_per_call"] * term["calls_per_eval"]
+        term["share"] = term["us_per_eval"] / (eval_ns / 1000) if eval_ns else 0.0
+        measured_us += term["us_per_eval"]
+        term["us_per_call"] = round(term["us_per_call"], 3)
+        term["us_per_eval"] = round(term["us_per_eval"], 3)
+        term["share"] = round(term["share"], 4)
+    terms.sort(key=lambda t: -t["us_per_eval"])
+
+    other_us = max(0.0, eval_ns / 1000 - measured_us)
+    return {
+        "version": EVAL_BENCH_VERSION,
+        "positions": len(boards),
+        "repeat": repeat,
+        "evaluate_board_us": round(eval_ns / 1000, 3),
+        "terms": terms,
+        # Terminal checks, material + PST loop and the glue between terms
+        "other_us": round(other_us, 3),
+        "other_share": round(other_us / (eval_ns / 1000), 4) if eval_ns else 0.0,
+    }
+
+
+# ==============================================================================
+# CACHE CHECK
+# ==============================================================================
+
+# Move numbers on both sides of every fullmove_number threshold of the evaluation
+CHECK_FULLMOVES = (1, KING_ACTIVITY_MIN_FULLMOVE, KING_ACTIVITY_MIN_FULLMOVE + 1, 80)
+
+
+def check_eval_cache(boards: list[chess.Board], report=print) -> bool:
+    """Cached static_eval against uncached evaluate_board; returns True when all agree."""
+    search.eval_cache.clear()
+    mismatches = 0
+    # Two passes: the first fills the cache across move numbers, the second reads it back
+    for _ in range(2):
+        for board in boards:
+            for fullmove in CHECK_FULLMOVES:
+                board = board.copy(stack=False)
+                board.fullmove_number = fullmove
+                expected = max(-search.MAX_EVAL, min(search.MAX_EVAL, evaluate_board(board)))
+                cached = search.static_eval(board)
+                if cached != expected:
+                    mismatches += 1
+                    if mismatches <= 10:
+                        report(f"FAIL {board.fen()}: cached {cached}, evaluate_board {expected}")
+    search.eval_cache.clear()
+    checked = 2 * len(boards) * len(CHECK_FULLMOVES)
+    report(f"{checked} evaluations, {mismatches} mismatch(es)" if mismatches else f"{checked} evaluations, all ok")
+    return not mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every evaluation term over a sample of positions.")
+    parser.add_argument("inputs", nargs="*", help="PGN or .epd files to sample (default: opening book lines + bench)")
+    parser.add_argument("--book-games", type=int, default=DEFAULT_BOOK_GAMES, help="book lines to walk without inputs")
+    parser.add_argument("--max-positions", type=int, default=DEFAULT_MAX_POSITIONS, help="sample size")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timing passes; the best is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the book lines and the sample")
+    parser.add_argument("--json", default=None, help="write the profile to this file")
+    parser.add_argument("--check-cache", action="store_true", help="check the evaluation cache instead")
+    args = parser.parse_args(argv)
+
+    boards = sample_positions(args.inputs, args.book_games, args.max_positions, args.seed)
+    if not boards:
+        parser.error("no position reaches the full evaluation")
+    if args.check_cache:
+        raise SystemExit(0 if check_eval_cache(boards) else 1)
+    profile = profile_terms(boards, args.repeat)
+
+    print(f"{profile['positions']} positions, evaluate_board {profile['evaluate_board_us']:.1f} us/call")
+    print(f"{'term':32s} {'us/call':>9s} {'us/eval':>9s} {'share':>7s} {'|cp|':>8s}")
+    for term in profile["terms"]:
+        impact = "-" if term["mean_abs_cp"] is None else f"{term['mean_abs_cp']:.1f}"
+        print(f"{term['name']:32s} {term['us_per_call']:9.2f} {term['us_per_eval']:9.2f} "
+              f"{term['share']:7.1%} {impact:>8s}")
+    print(f"{'(material, PST, terminal checks)':32s} {'':9s} {profile['other_us']:9.2f} {profile['other_share']:7.1%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
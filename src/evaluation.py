@@ -1,5 +1,6 @@
 import chess
 from .constant import *
+from .endgame import evaluate_known_endgame
 
 # =================================================================================
 # CÁC HÀM TIỆN ÍCH VỀ BITBOARD
@@ -71,7 +72,7 @@ def is_file_semi_open(board: chess.Board, file_i: int, color: chess.Color) -> bo
 # TÍNH TOÁN GIAI ĐOẠN VÁN CỜ (PHASE)
 # =================================================================================
 
-def phase_score_calculator(current_phase_score: int, mg_score: int, eg_score: int) -> float:
+def phase_score_calculator(current_phase_score: int, mg_score: int, eg_score: int) -> int:
     """
     Tính toán điểm số cuối cùng dựa trên giai đoạn của ván cờ (tapered evaluation).
     Ý tưởng là điểm số của một thế cờ sẽ thay đổi tùy thuộc vào việc nó đang ở
@@ -86,9 +87,23 @@ def phase_score_calculator(current_phase_score: int, mg_score: int, eg_score: in
     Công thức này nội suy tuyến tính giữa điểm MG và EG.
     Nếu phase gần TOTAL_PHASE (trung cuộc), kết quả sẽ gần với mg_score.
     Nếu phase gần 0 (tàn cuộc), kết quả sẽ gần với eg_score.
+
+    Phép nội suy dùng số nguyên fixed-point: trọng số phase đã được quy về thang
+    PHASE_SCALE trong PHASE_WEIGHTS, nên chỉ cần nhân và dịch bit, kết quả là centipawn nguyên.
     """
     phase = min(current_phase_score, TOTAL_PHASE) # Đảm bảo phase không vượt quá giá trị tối đa
-    return (mg_score * phase + eg_score * (TOTAL_PHASE - phase)) / TOTAL_PHASE
+    weight = PHASE_WEIGHTS[phase]
+    score = mg_score * weight + eg_score * (PHASE_SCALE - weight)
+    # Làm tròn đối xứng quanh 0 để thế cờ đối xứng cho điểm đối nhau
+    return score >> PHASE_SHIFT if score >= 0 else -((-score) >> PHASE_SHIFT)
+
+def get_game_phase(board: chess.Board) -> int:
+    """
+    Điểm giai đoạn (phase) của thế cờ: tổng PHASE_VALUES của các quân còn trên bàn.
+    """
+    total_counts = {pt: count_bits(int(board.pieces(pt, chess.WHITE) | board.pieces(pt, chess.BLACK)))
+                    for pt in chess.PIECE_TYPES}
+    return sum(total_counts.get(pt, 0) * PHASE_VALUES.get(pt, 0) for pt in total_counts)
 
 # =================================================================================
 # ĐÁNH GIÁ CẤU TRÚC TỐT (PAWN EVALUATION)
@@ -415,7 +430,7 @@ def king_attack_zone_penalty(board: chess.Board, color: chess.Color)-> tuple[int
     # Nhiều quân tấn công phối hợp sẽ nguy hiểm hơn tổng giá trị của chúng.
     multiplier = ATTACK_WEIGHT_MULTIPLIER[min(attackers, len(ATTACK_WEIGHT_MULTIPLIER)-1)]
     # Chỉ phạt ở trung cuộc, vì ở tàn cuộc Vua cần hoạt động
-    return int(value * multiplier / 100), 0
+    return value * multiplier // 100, 0
 
 def king_activity_bonus(board: chess.Board, color: chess.Color):
     """
@@ -428,11 +443,12 @@ def king_activity_bonus(board: chess.Board, color: chess.Color):
     if king_sq is None:
         return 0, 0
     # Chỉ áp dụng ở giai đoạn cuối ván cờ
-    if board.fullmove_number > 30:
+    if board.fullmove_number > KING_ACTIVITY_MIN_FULLMOVE:
         # Tính khoảng cách Manhattan từ Vua đến trung tâm (ô giữa D4, E4, D5, E5)
-        center_distance = abs(3.5 - chess.square_file(king_sq)) + abs(3.5 - chess.square_rank(king_sq))
+        # Tính trên tọa độ nhân đôi để giữ số nguyên: |7 - 2f| + |7 - 2r| luôn chẵn
+        center_distance = (abs(7 - 2 * chess.square_file(king_sq)) + abs(7 - 2 * chess.square_rank(king_sq))) // 2
         # Càng gần trung tâm, điểm thưởng càng cao
-        bonus = int((7 - center_distance) * KING_ACTIVITY_BONUS_EG)
+        bonus = (7 - center_distance) * KING_ACTIVITY_BONUS_EG
         eg += bonus
     return mg, eg
 
@@ -559,7 +575,7 @@ def evaluate_attacks(board: chess.Board, color: chess.Color)-> tuple[int, int]:
 # =================================================================================
 # HÀM ĐÁNH GIÁ CHÍNH (MAIN EVALUATION)
 # =================================================================================
-def evaluate_board(board: chess.Board) -> float:
+def evaluate_board(board: chess.Board) -> int:
     """
     Hàm đánh giá tổng thể, kết hợp tất cả các yếu tố để đưa ra một điểm số duy nhất cho thế cờ.
     Điểm dương là lợi thế cho Trắng, điểm âm là lợi thế cho Đen.
@@ -570,12 +586,16 @@ def evaluate_board(board: chess.Board) -> float:
         return -MATE_SCORE
     if board.is_stalemate() or board.is_insufficient_material() or board.can_claim_fifty_moves() or board.is_seventyfive_moves():
         # Các trường hợp hòa cờ
-        return 0.0
+        return 0
+
+    # 1b. Tàn cuộc đã biết (KPK, KRK, KBNK...): tra bảng theo chữ ký vật chất và dùng
+    # hàm đánh giá chuyên biệt thay vì tính toàn bộ các thành phần bên dưới
+    endgame_score = evaluate_known_endgame(board)
+    if endgame_score is not None:
+        return endgame_score
 
     # 2. Tính toán giai đoạn ván cờ (Phase)
-    total_counts = {pt: count_bits(int(board.pieces(pt, chess.WHITE) | board.pieces(pt, chess.BLACK)))
-                    for pt in chess.PIECE_TYPES}
-    current_phase_score = sum(total_counts.get(pt, 0) * PHASE_VALUES.get(pt, 0) for pt in total_counts)
+    current_phase_score = get_game_phase(board)
 
     mg_total, eg_total = 0, 0
 
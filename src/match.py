@@ -0,0 +1,339 @@
+"""
+Play a match between two UCI engine configurations on a process pool.
+
+    python -m src.match --engine name=new --engine name=base dir=../baseline \\
+        --openings openings.epd --games 200 --tc 10+0.1 --concurrency 4 --pgn match.pgn
+    python -m src.match --engine name=nobook option.OwnBook=false --engine name=book \\
+        --nodes 5000 --sprt 0 10
+
+Each --engine takes space-separated key=value fields: name, cmd (default: this
+python running main.py), dir (working directory, default: this checkout) and any
+number of option.<UCI name>=<value>. Every opening (last position of each PGN game,
+or each EPD line) is played twice with colours reversed. Games are written to the PGN
+file as they finish, and the score of the first engine is reported as Elo with a 95%
+error bar. With --sprt the match stops as soon as the test accepts H0 or H1.
+--nodes, --depth and --movetime may be combined with --tc: every "go" then carries
+both the per-move limit and the clocks the games are adjudicated on.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import shlex
+import sys
+import time
+
+import chess
+import chess.engine
+import chess.pgn
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(PACKAGE_DIR)
+
+DEFAULT_MAX_PLIES = 400
+DEFAULT_TIME_MARGIN_MS = 100
+
+# Game results from the first engine's point of view
+WIN, DRAW, LOSS = 1.0, 0.5, 0.0
+
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+
+def parse_engine(spec: str, index: int) -> dict:
+    """'name=new dir=../old option.Hash=16' -> {name, cmd, dir, options}."""
+    engine = {"name": f"engine{index + 1}", "cmd": None, "dir": ROOT_DIR, "options": {}}
+    for field in shlex.split(spec):
+        key, sep, value = field.partition("=")
+        if not sep:
+            raise ValueError(f"engine field {field!r} is not key=value")
+        if key.startswith("option."):
+            engine["options"][key[len("option."):]] = value
+        elif key in ("name", "cmd", "dir"):
+            engine[key] = value
+        else:
+            raise ValueError(f"unknown engine field {key!r}")
+    if engine["cmd"] is None:
+        engine["cmd"] = f"{shlex.quote(sys.executable)} main.py"
+    return engine
+
+
+def parse_tc(text: str) -> tuple[float, float]:
+    """'10+0.1' -> (10.0, 0.1) seconds of base time and increment."""
+    base, _, inc = text.partition("+")
+    return float(base), float(inc or 0)
+
+
+def load_openings(path: str) -> list[str]:
+    """Start FENs: every EPD line, or the final position of every PGN game."""
+    fens = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if path.lower().endswith(".epd"):
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    fens.append(chess.Board.from_epd(line)[0].fen())
+        else:
+            while True:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                fens.append(game.end().board().fen())
+    return fens
+
+
+# ==============================================================================
+# STATISTICS
+# ==============================================================================
+
+def score_to_elo(score: float) -> float:
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+def elo_to_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_stats(wins: int, draws: int, losses: int) -> tuple[float, float]:
+    """Mean and per-game variance of the score."""
+    n = wins + draws + losses
+    mean = (wins + draws / 2) / n
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / n
+    return mean, variance
+
+
+def elo_estimate(wins: int, draws: int, losses: int) -> tuple[float, float]:
+    """Elo difference and the half-width of its 95% confidence interval."""
+    n = wins + draws + losses
+    if n == 0:
+        return 0.0, 0.0
+    mean, variance = score_stats(wins, draws, losses)
+    margin = 1.959964 * math.sqrt(variance / n)
+    low, high = score_to_elo(mean - margin), score_to_elo(mean + margin)
+    return score_to_elo(mean), (high - low) / 2
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """Log-likelihood ratio of H1 (elo1) against H0 (elo0), normal approximation of the trinomial GSPRT."""
+    n = wins + draws + losses
+    if n == 0:
+        return 0.0
+    mean, variance = score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float) -> tuple[float, float]:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# ==============================================================================
+# WORKERS
+# ==============================================================================
+
+_engines = None
+_settings = None
+
+
+def _open_engine(config: dict) -> chess.engine.SimpleEngine:
+    engine = chess.engine.SimpleEngine.popen_uci(shlex.split(config["cmd"]), cwd=config["dir"])
+    if config["options"]:
+        engine.configure(config["options"])
+    return engine
+
+
+def init_worker(configs: list, settings: dict):
+    # Each worker keeps both engines running for all of its games. They exit on their
+    # own when the worker dies and their stdin is closed.
+    global _engines, _settings
+    _settings = settings
+    _engines = [_open_engine(config) for config in configs]
+
+
+def _limit(clocks: dict, inc: float) -> chess.engine.Limit:
+    """Per-move limits plus the clocks: with --tc the engine always sees the clock it is flagged on."""
+    clocked = clocks[chess.WHITE] is not None
+    return chess.engine.Limit(nodes=_settings["nodes"], depth=_settings["depth"],
+                              time=_settings["movetime"] and _settings["movetime"] / 1000,
+                              white_clock=clocks[chess.WHITE], black_clock=clocks[chess.BLACK],
+                              white_inc=inc if clocked else None, black_inc=inc if clocked else None)
+
+
+def play_game(task) -> dict:
+    """Worker: play one game from an opening. engine 0 has White when first_white is True."""
+    index, fen, first_white = task
+    board = chess.Board(fen)
+    start_ply = board.ply()
+    # Engine index (into _engines) playing each colour
+    players = {chess.WHITE: 0 if first_white else 1, chess.BLACK: 1 if first_white else 0}
+    base, inc = _settings["tc"] or (None, 0)
+    clocks = {chess.WHITE: base, chess.BLACK: base}
+    game_id = object()  # a new object makes python-chess send ucinewgame
+    result = termination = None
+
+    while result is None:
+        outcome = board.outcome(claim_draw=True)
+        if outcome is not None:
+            result, termination = outcome.result(), outcome.termination.name.lower()
+            break
+        if board.ply() - start_ply >= _settings["max_plies"]:
+            result, termination = "1/2-1/2", "adjudication"
+            break
+        turn = board.turn
+        engine = _engines[players[turn]]
+        start = time.perf_counter()
+        try:
+            played = engine.play(board, _limit(clocks, inc), game=game_id)
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError) as e:
+            result, termination = ("0-1" if turn == chess.WHITE else "1-0"), f"engine error: {e}"
+            if isinstance(e, chess.engine.EngineTerminatedError):
+                _engines[players[turn]] = _open_engine(_settings["configs"][players[turn]])
+            break
+        elapsed = time.perf_counter() - start
+        if base is not None:
+            clocks[turn] -= elapsed
+            if clocks[turn] < -_settings["time_margin"]:
+                result, termination = ("0-1" if turn == chess.WHITE else "1-0"), "time forfeit"
+                break
+            clocks[turn] += inc
+        if played.move is None or played.move not in board.legal_moves:
+            result, termination = ("0-1" if turn == chess.WHITE else "1-0"), f"illegal move {played.move}"
+            break
+        board.push(played.move)
+
+    names = [config["name"] for config in _settings["configs"]]
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = _settings["event"]
+    game.headers["Round"] = str(index // 2 + 1)
+    game.headers["White"] = names[players[chess.WHITE]]
+    game.headers["Black"] = names[players[chess.BLACK]]
+    game.headers["Result"] = result
+    game.headers["Termination"] = termination
+    game.headers["TimeControl"] = _settings["tc_header"]
+
+    white_score = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+    return {"index": index, "score": white_score if first_white else 1 - white_score,
+            "pgn": str(game), "termination": termination}
+
+
+# ==============================================================================
+# MATCH
+# ==============================================================================
+
+def format_status(wins: int, draws: int, losses: int, sprt=None) -> str:
+    elo, margin = elo_estimate(wins, draws, losses)
+    n = wins + draws + losses
+    status = f"Games {n}: +{wins} ={draws} -{losses}  score {(wins + draws / 2) / max(n, 1):.3f}  " \
+             f"Elo {elo:+.1f} +/- {margin:.1f}"
+    if sprt is not None:
+        elo0, elo1, lower, upper = sprt
+        status += f"  LLR {sprt_llr(wins, draws, losses, elo0, elo1):+.2f} [{lower:.2f}, {upper:.2f}]"
+    return status
+
+
+def run_match(configs: list, openings: list, games: int, tc=None, nodes: int = None, depth: int = None,
+              movetime: int = None, concurrency: int = None, pgn_path: str = None, sprt=None,
+              alpha: float = 0.05, beta: float = 0.05, max_plies: int = DEFAULT_MAX_PLIES,
+              time_margin_ms: int = DEFAULT_TIME_MARGIN_MS, event: str = "Match", report=print) -> dict:
+    """Play up to `games` games (pairs of colour-reversed games per opening) and return the stats.
+
+    sprt is (elo0, elo1); the match then ends early when the LLR leaves its bounds.
+    """
+    if tc is not None:
+        tc_header = f"{tc[0]:g}+{tc[1]:g}"
+    elif movetime:
+        tc_header = f"{movetime / 1000:g}/move"
+    else:
+        tc_header = "-"
+    settings = {"configs": configs, "tc": tc, "nodes": nodes, "depth": depth, "movetime": movetime,
+                "max_plies": max_plies, "time_margin": time_margin_ms / 1000, "event": event,
+                "tc_header": tc_header}
+    tasks = [(i, openings[(i // 2) % len(openings)], i % 2 == 0) for i in range(games)]
+    bounds = sprt_bounds(alpha, beta) if sprt else None
+    sprt_info = (*sprt, *bounds) if sprt else None
+
+    wins = draws = losses = 0
+    decision = None
+    pgn = open(pgn_path, "w", encoding="utf-8") if pgn_path else None
+    pool = multiprocessing.Pool(concurrency, initializer=init_worker, initargs=(configs, settings))
+    try:
+        for game in pool.imap_unordered(play_game, tasks):
+            if game["score"] == WIN:
+                wins += 1
+            elif game["score"] == DRAW:
+                draws += 1
+            else:
+                losses += 1
+            if pgn is not None:
+                pgn.write(game["pgn"] + "\n\n")
+                pgn.flush()
+            report(format_status(wins, draws, losses, sprt_info))
+            if sprt:
+                llr = sprt_llr(wins, draws, losses, *sprt)
+                if llr <= bounds[0]:
+                    decision = "H0"
+                    break
+                if llr >= bounds[1]:
+                    decision = "H1"
+                    break
+    finally:
+        pool.terminate()
+        if pgn is not None:
+            pgn.close()
+
+    elo, margin = elo_estimate(wins, draws, losses)
+    stats = {"wins": wins, "draws": draws, "losses": losses, "elo": elo, "elo_margin": margin}
+    if sprt:
+        stats["llr"] = sprt_llr(wins, draws, losses, *sprt)
+        stats["sprt"] = decision
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a two-engine UCI match on a process pool.")
+    parser.add_argument("--engine", action="append", required=True,
+                        help="engine fields: name=... cmd=... dir=... option.<name>=... (give twice)")
+    parser.add_argument("--openings", default=None, help="EPD or PGN file of start positions (default: startpos)")
+    parser.add_argument("--games", type=int, default=100, help="maximum number of games")
+    parser.add_argument("--tc", default=None, help="clock per game as base+inc in seconds, e.g. 10+0.1")
+    parser.add_argument("--nodes", type=int, default=None, help="node limit per move")
+    parser.add_argument("--depth", type=int, default=None, help="depth limit per move")
+    parser.add_argument("--movetime", type=int, default=None, help="time per move (ms)")
+    parser.add_argument("--concurrency", type=int, default=None, help="games played at once (default: CPU count)")
+    parser.add_argument("--pgn", default=None, help="write the games to this PGN file")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"), default=None,
+                        help="stop when the SPRT of H0: elo0 against H1: elo1 decides")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="adjudicate a draw after N plies")
+    parser.add_argument("--time-margin", type=int, default=DEFAULT_TIME_MARGIN_MS,
+                        help="ms an engine may overstep its clock before it forfeits")
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error("give --engine exactly twice")
+    if not (args.tc or args.nodes or args.depth or args.movetime):
+        parser.error("give at least one of --tc, --nodes, --depth or --movetime")
+
+    try:
+        configs = [parse_engine(spec, i) for i, spec in enumerate(args.engine)]
+    except ValueError as e:
+        parser.error(str(e))
+    openings = load_openings(args.openings) if args.openings else [chess.STARTING_FEN]
+    if not openings:
+        parser.error(f"no positions in {args.openings}")
+
+    start = time.perf_counter()
+    stats = run_match(configs, openings, args.games, parse_tc(args.tc) if args.tc else None, args.nodes,
+                      args.depth, args.movetime, args.concurrency, args.pgn, args.sprt, args.alpha, args.beta,
+                      args.max_plies, args.time_margin, f"{configs[0]['name']} vs {configs[1]['name']}")
+    print(f"Finished in {time.perf_counter() - start:.1f}s: {configs[0]['name']} vs {configs[1]['name']} "
+          f"{format_status(stats['wins'], stats['draws'], stats['losses'])}"
+          + (f"  SPRT: {stats['sprt'] or 'undecided'}" if args.sprt else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+One memory budget for all engine caches.
+
+    python -m src.memory --budget 64                      # show how 64 MB is split
+    python -m src.memory --budget 64 --depth 4 --fen ...  # fill the caches with a search, then report
+
+configure_memory(total_mb) splits the budget over the bounded in-memory caches
+and resizes them at once (oldest entries are evicted when a cache shrinks):
+
+- tt          transposition table (src/search.py)
+- eval        static evaluation cache (src/search.py)
+- book        opening book lookup cache (src/book.py)
+- tablebase   Syzygy WDL probe cache (src/tablebase.py)
+
+There is no pawn hash table: the pawn terms are evaluated directly and the whole
+evaluation is cached instead. Call it between searches (the UCI "Hash" option,
+the --hash flag of batch and server): a search running meanwhile keeps going
+with the tables it has.
+
+memory_report() measures what each structure actually holds (the objects are
+walked, not estimated from entry counts), plus the fixed tables (KPK bitbase),
+the file-backed analysis cache mapping and the resident size of the process,
+so the number of engine processes a host can take can be worked out from real
+figures.
+"""
+import argparse
+import os
+import sys
+
+from . import book, endgame, search, tablebase
+from .analysis_cache import get_analysis_cache
+from .board import GameState
+
+DEFAULT_MEMORY_MB = 48
+
+# Share of the budget per cache; the TT gains the most from extra memory
+DEFAULT_SHARES = {"tt": 0.75, "eval": 0.18, "book": 0.02, "tablebase": 0.05}
+
+# Cache name -> estimated bytes per entry the resizer sizes it with (checked by the report)
+ENTRY_BYTES = {
+    "tt": search.TT_ENTRY_BYTES,
+    "eval": search.EVAL_CACHE_ENTRY_BYTES,
+    "book": book.BOOK_CACHE_ENTRY_BYTES,
+    "tablebase": tablebase.PROBE_CACHE_ENTRY_BYTES,
+}
+
+# Cache name -> function resizing it to a number of megabytes
+RESIZERS = {
+    "tt": search.set_hash_size,
+    "eval": search.set_eval_cache_size,
+    "book": book.set_book_cache_size,
+    "tablebase": tablebase.set_probe_cache_size,
+}
+
+
+class MemoryBudget:
+    """A total number of megabytes and the share each cache gets."""
+
+    def __init__(self, total_mb: float = DEFAULT_MEMORY_MB, shares: dict = None):
+        shares = dict(DEFAULT_SHARES if shares is None else shares)
+        unknown = set(shares) - set(RESIZERS)
+        if unknown:
+            raise ValueError(f"unknown cache(s): {', '.join(sorted(unknown))}")
+        if total_mb <= 0:
+            raise ValueError("the memory budget must be positive")
+        total_share = sum(shares.values())
+        self.total_mb = total_mb
+        self.shares = {name: shares.get(name, 0) / total_share for name in RESIZERS}
+
+    def allocation(self) -> dict:
+        """Bytes handed to every cache."""
+        return {name: int(self.total_mb * share * (1 << 20)) for name, share in self.shares.items()}
+
+    def apply(self):
+        for name, size in self.allocation().items():
+            RESIZERS[name](size / (1 << 20))
+
+
+_budget = None
+
+
+def configure_memory(total_mb: float = DEFAULT_MEMORY_MB, shares: dict = None) -> MemoryBudget:
+    """Set the process-wide budget and resize every cache to its share now."""
+    global _budget
+    _budget = MemoryBudget(total_mb, shares)
+    _budget.apply()
+    return _budget
+
+
+def get_memory_budget():
+    """The configured budget, or None while the caches keep their module defaults."""
+    return _budget
+
+
+# ==============================================================================
+# REPORT
+# ==============================================================================
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """Bytes of obj and of everything it references that was not counted yet."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), "__slots__", ()):
+                if hasattr(item, slot):
+                    stack.append(getattr(item, slot))
+    return total
+
+
+def _shared_objects() -> set:
+    """ids of interned objects (small ints, None, booleans) no cache owns."""
+    return {id(x) for x in (None, True, False, *range(-5, 257))}
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes (None where it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current size; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_report() -> dict:
+    """Budget, capacity, entries and measured bytes of every cache, plus fixed structures."""
+    allocation = _budget.allocation() if _budget is not None else {}
+    book_cache = book._book._cache if book._book is not None else {}
+    prober = tablebase._prober
+    caches = {
+        "tt": (search.transposition_table, search.tt_max_entries),
+        "eval": (search.eval_cache, search.eval_cache_max_entries),
+        "book": (book_cache, book._book.cache_size if book._book is not None else book.book_cache_size),
+        "tablebase": (prober._wdl_cache if prober is not None else {},
+                      prober.cache_size if prober is not None else tablebase.probe_cache_size),
+    }
+    report = {"budget_mb": _budget.total_mb if _budget is not None else None, "caches": {}}
+    for name, (table, capacity) in caches.items():
+        report["caches"][name] = {
+            "budget": allocation.get(name),
+            "capacity": capacity,
+            "entries": len(table),
+            "resident": deep_sizeof(table, _shared_objects()),
+            "entry_estimate": ENTRY_BYTES[name],
+        }
+
+    analysis_cache = get_analysis_cache()
+    report["fixed"] = {
+        # Loaded when an engine entry point starts (load_kpk_bitbase)
+        "kpk_bitbase": len(endgame._kpk_bits) if endgame._kpk_bits is not None else 0,
+        # File-backed pages: shared between processes and reclaimable, not counted against the budget
+        "analysis_cache_mapped": len(analysis_cache._map) if analysis_cache is not None else 0,
+    }
+    report["cache_total"] = sum(entry["resident"] for entry in report["caches"].values())
+    report["process_rss"] = process_rss()
+    return report
+
+
+def _mb(size) -> str:
+    return "-" if size is None else f"{size / (1 << 20):.2f}"
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'cache':10s} {'budget MB':>10s} {'capacity':>10s} {'entries':>10s} {'resident MB':>12s} "
+             f"{'B/entry':>8s} {'estimate':>8s}"]
+    for name, entry in report["caches"].items():
+        per_entry = f"{entry['resident'] // entry['entries']}" if entry["entries"] else "-"
+        lines.append(f"{name:10s} {_mb(entry['budget']):>10s} {entry['capacity']:10d} {entry['entries']:10d} "
+                     f"{_mb(entry['resident']):>12s} {per_entry:>8s} {entry['entry_estimate']:8d}")
+    budget = report["budget_mb"] * (1 << 20) if report["budget_mb"] is not None else None
+    lines.append(f"{'total':10s} {_mb(budget):>10s} {'':10s} {'':10s} {_mb(report['cache_total']):>12s}")
+    for name, size in report["fixed"].items():
+        lines.append(f"{name:32s} {_mb(size):>12s} MB")
+    lines.append(f"{'process resident set':32s} {_mb(report['process_rss']):>12s} MB")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split a memory budget over the engine caches and measure them.")
+    parser.add_argument("--budget", type=float, default=DEFAULT_MEMORY_MB, help="total MB for all caches")
+    parser.add_argument("--fen", default=None, help="position to search before reporting (default: start)")
+    parser.add_argument("--depth", type=int, default=0, help="search this deep first to fill the caches")
+    parser.add_argument("--nodes", type=int, default=None, help="node limit of that search")
+    args = parser.parse_args(argv)
+
+    configure_memory(args.budget)
+    if args.depth:
+        book.configure_opening_book(paths=[])
+        search.find_best_move(GameState(args.fen) if args.fen else GameState(), args.depth, node_limit=args.nodes)
+    print(format_report(memory_report()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Profiling hook for searches: cProfile statistics plus sampled call stacks.
+
+    python -m src.bench --positions 5 --profile prof/            # any entry point with --profile DIR
+    python -m src.batch tests.epd -o out.jsonl --depth 3 --profile prof/
+    python main.py --profile prof/                                # UCI: one profile per "go"
+    python -m src.profiling prof/old/bench.json prof/new/bench.json   # compare two runs
+
+A SearchProfiler wraps a block of code (normally one search). cProfile records
+exact call counts and times; at the same time a background thread samples the
+stack of the profiled thread every --interval, which gives the call paths a
+flame graph needs. For a profile called NAME the output directory receives:
+
+- NAME.pstats     cProfile data (python -m pstats, snakeviz, ...)
+- NAME.collapsed  sampled stacks in collapsed form ("a;b;c 12"), for
+                  flamegraph.pl or speedscope
+- NAME.json       summary: self time per group and the most expensive functions
+
+Groups separate our hot modules (src/search.py, src/evaluation.py, src/board.py,
+the rest of src/) from python-chess internals and everything else. Time spent in
+builtins is charged to the group of the Python function that called them. Two
+summaries can be compared with the command-line mode above.
+"""
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+import chess
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+CHESS_DIR = os.path.dirname(os.path.abspath(chess.__file__))
+
+PROFILE_VERSION = 1
+DEFAULT_SAMPLE_INTERVAL = 0.001  # seconds
+TOP_FUNCTIONS = 30
+
+# Our modules that get a group of their own; the rest of src/ is "engine"
+MODULE_GROUPS = {"search.py": "search", "evaluation.py": "evaluation", "board.py": "board"}
+GROUPS = ("search", "evaluation", "board", "engine", "python-chess", "other")
+
+
+def classify(filename: str) -> str:
+    """Group of a source file (see MODULE_GROUPS)."""
+    path = os.path.abspath(filename)
+    if path.startswith(SRC_DIR + os.sep):
+        return MODULE_GROUPS.get(os.path.relpath(path, SRC_DIR), "engine")
+    if path.startswith(CHESS_DIR + os.sep):
+        return "python-chess"
+    if path.startswith(ROOT_DIR + os.sep):
+        return "engine"
+    return "other"
+
+
+def short_path(filename: str) -> str:
+    """src/search.py, chess/__init__.py, ... instead of absolute paths."""
+    path = os.path.abspath(filename)
+    for base in (ROOT_DIR, os.path.dirname(CHESS_DIR)):
+        if path.startswith(base + os.sep):
+            return os.path.relpath(path, base).replace(os.sep, "/")
+    return os.path.basename(filename)
+
+
+def _is_builtin(func) -> bool:
+    return func[0] == "~"
+
+
+def _function_label(func) -> str:
+    filename, line, name = func
+    return name if _is_builtin(func) else f"{short_path(filename)}:{line}({name})"
+
+
+# ==============================================================================
+# STACK SAMPLER
+# ==============================================================================
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, skip_frames: int, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        # Frames between the thread's entry point and the profiled block, left out of every stack
+        self.skip_frames = skip_frames
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{short_path(code.co_filename)}:{code.co_qualname}")
+                frame = frame.f_back
+            stack = stack[::-1][self.skip_frames:]
+            if stack:
+                key = ";".join(stack)
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _stack_depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+# ==============================================================================
+# PROFILER
+# ==============================================================================
+
+class SearchProfiler:
+    """Context manager that profiles the enclosed block and writes NAME.* into out_dir.
+
+        with SearchProfiler("prof", "bench"):
+            run_bench()
+    """
+
+    def __init__(self, out_dir: str, name: str, interval: float = DEFAULT_SAMPLE_INTERVAL, report=print):
+        self.out_dir = out_dir
+        self.name = name
+        self.interval = interval
+        self.report = report
+        self.summary = None
+
+    def __enter__(self):
+        # The block runs one frame below this one: skip everything up to and including it
+        self._sampler = StackSampler(threading.get_ident(), _stack_depth(sys._getframe(1)), self.interval)
+        self._profile = cProfile.Profile()
+        self._start = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+        self._sampler.stop()
+        seconds = time.perf_counter() - self._start
+        self.summary = self.write(seconds)
+        if self.report is not None:
+            self.report(format_summary(self.summary))
+            self.report(f"Profile written to {os.path.join(self.out_dir, self.name)}.{{pstats,collapsed,json}}")
+        return False
+
+    def write(self, seconds: float) -> dict:
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, self.name)
+        self._profile.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._sampler.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        summary = summarize(pstats.Stats(self._profile), self._sampler, seconds, self.name)
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+        return summary
+
+
+# ==============================================================================
+# SUMMARY
+# ==============================================================================
+
+def summarize(stats: pstats.Stats, sampler: StackSampler, seconds: float, name: str) -> dict:
+    """Self time per group (builtins charged to their callers) and the top functions."""
+    group_time = dict.fromkeys(GROUPS, 0.0)
+    for func, (_, _, tottime, _, callers) in stats.stats.items():
+        if not _is_builtin(func):
+            group_time[classify(func[0])] += tottime
+            continue
+        # Split the builtin's time over its callers by the time each of them spent in it
+        caller_times = {caller: values[2] for caller, values in callers.items()}
+        caller_total = sum(caller_times.values())
+        if not caller_total:
+            group_time["other"] += tottime
+            continue
+        for caller, caller_time in caller_times.items():
+            group = "other" if _is_builtin(caller) else classify(caller[0])
+            group_time[group] += tottime * caller_time / caller_total
+    profiled = sum(group_time.values())
+
+    # The sampled stacks give the same split by the group of their innermost frame
+    sample_groups = dict.fromkeys(GROUPS, 0)
+    for stack, count in sampler.stacks.items():
+        sample_groups[classify_label(stack.rsplit(";", 1)[-1])] += count
+
+    top = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:TOP_FUNCTIONS]
+    return {
+        "version": PROFILE_VERSION,
+        "name": name,
+        "seconds": round(seconds, 3),
+        "profiled_seconds": round(profiled, 3),
+        "groups": {group: {"self_s": round(t, 4), "share": round(t / profiled, 4) if profiled else 0.0}
+                   for group, t in group_time.items()},
+        "samples": sampler.samples,
+        "sample_interval": sampler.interval,
+        "sample_groups": {group: round(n / sampler.samples, 4) if sampler.samples else 0.0
+                          for group, n in sample_groups.items()},
+        "top": [{"function": _function_label(func), "group": "builtin" if _is_builtin(func) else classify(func[0]),
+                 "calls": nc, "self_s": round(tt, 4), "cum_s": round(ct, 4)}
+                for func, (_, nc, tt, ct, _) in top],
+    }
+
+
+def classify_label(label: str) -> str:
+    """Group of a 'path:function' stack frame label written by StackSampler."""
+    path = label.split(":", 1)[0]
+    if path.startswith("src/"):
+        return MODULE_GROUPS.get(path[4:], "engine")
+    if path.startswith("chess/"):
+        return "python-chess"
+    return "engine" if os.path.exists(os.path.join(ROOT_DIR, path)) else "other"
+
+
+def format_summary(summary: dict, top: int = 10) -> str:
+    lines = [f"Profile {summary['name']}: {summary['seconds']:.2f}s, {summary['samples']} samples",
+             f"{'group':14s} {'self s':>9s} {'share':>7s} {'sampled':>8s}"]
+    for group in GROUPS:
+        entry = summary["groups"][group]
+        lines.append(f"{group:14s} {entry['self_s']:9.3f} {entry['share']:7.1%} {summary['sample_groups'][group]:8.1%}")
+    lines.append(f"{'function':60s} {'calls':>9s} {'self s':>8s} {'cum s':>8s}")
+    for entry in summary["top"][:top]:
+        lines.append(f"{entry['function'][-60:]:60s} {entry['calls']:9d} {entry['self_s']:8.3f} {entry['cum_s']:8.3f}")
+    return "\n".join(lines)
+
+
+def compare_summaries(old: dict, new: dict, report=print):
+    """Group shares and top functions of two summaries side by side."""
+    report(f"{'group':14s} {'old':>7s} {'new':>7s} {'change':>8s}")
+    for group in GROUPS:
+        a, b = old["groups"][group]["share"], new["groups"][group]["share"]
+        report(f"{group:14s} {a:7.1%} {b:7.1%} {(b - a) * 100:+7.1f}pp")
+    report(f"total self time {old['profiled_seconds']:.3f}s -> {new['profiled_seconds']:.3f}s")
+
+    old_top = {entry["function"]: entry for entry in old["top"]}
+    report(f"{'function':60s} {'old s':>8s} {'new s':>8s}")
+    for entry in new["top"]:
+        before = old_top.get(entry["function"])
+        old_time = f"{before['self_s']:8.3f}" if before else f"{'-':>8s}"
+        report(f"{entry['function'][-60:]:60s} {old_time} {entry['self_s']:8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two profile summaries written by --profile.")
+    parser.add_argument("old", help="NAME.json of the earlier run")
+    parser.add_argument("new", help="NAME.json of the later run")
+    args = parser.parse_args(argv)
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    compare_summaries(old, new)
+
+
+if __name__ == "__main__":
+    main()
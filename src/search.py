@@ -1,11 +1,24 @@
 import chess
 import chess.polyglot
+import logging
+import random
 import time
-from chess import polyglot
+from array import array
+from dataclasses import dataclass, field
 from .evaluation import evaluate_board
-from .board import GameState
-from .constant import MVV_LVA_SCORES
+from .board import GameState, get_check_info, generate_pseudo_legal_moves, \
+    generate_pseudo_legal_tactical_moves, is_safe_move, encode_move, decode_move, NO_MOVE
+from .constant import MVV_LVA_SCORES, KING_ACTIVITY_MIN_FULLMOVE
+from .book import get_opening_book
+from .tablebase import get_tablebases
+from .analysis_cache import get_analysis_cache
+from .timeman import TimeManager
 import copy
+
+# Silent unless the application configures logging; per-iteration lines are logged at DEBUG
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
 # ==============================================================================
 # DATA STRUCTURES AND ADVANCED CONSTANTS
 # ==============================================================================
@@ -13,40 +26,97 @@ import copy
 position_count = 0
 MAX_DEPTH = 64
 MATE_VALUE = 100000
-
-# Time management
+# Integer bound sentinels: every reachable score, including stored TT scores, lies in
+# [-MATE_VALUE, MATE_VALUE] and therefore fits a signed 32-bit field.
+INF = MATE_VALUE + 1
+# Tablebase wins rank below mates (|score| > MATE_VALUE - 1000) but above any static evaluation
+TB_WIN_VALUE = MATE_VALUE - 2000
+# Static evaluations are clamped below the tablebase range so they are never mistaken for
+# proven results; tablebase scores lie in (MAX_EVAL, TB_WIN_VALUE]
+MAX_EVAL = TB_WIN_VALUE - 1000
+
+# Time management: start of the running search (for reports) and its TimeManager (None = no clock)
 search_start_time = 0
-search_time_limit = 0
+search_time_manager = None
+# Node limit for the current search (0 = none)
+search_node_limit = 0
+# Book seed of deterministic searches (the only random choice the engine makes)
+DETERMINISTIC_SEED = 0
 
 # Transposition Table Flags
 TT_EXACT, TT_LOWERBOUND, TT_UPPERBOUND = 0, 1, 2
 
-# Killer Moves and History Heuristic
-killer_moves = [[None, None] for _ in range(MAX_DEPTH)]
-history_heuristic = [[[0] * 64 for _ in range(64)] for _ in range(2)]
+# Killer Moves and History Heuristic, stored as flat int buffers of encoded moves
+# killer_moves[depth * 2 + slot], history_heuristic[color << 12 | to << 6 | from] (the low 12 bits of encode_move)
+killer_moves = array('i', [NO_MOVE]) * (MAX_DEPTH * 2)
+history_heuristic = array('i', [0]) * (2 * 64 * 64)
 
 # Pruning constants
 NULL_MOVE_REDUCTION = 2
 
+# Syzygy prober for the current search (None when no tablebases are configured)
+tablebases = None
+
+
+class StopToken:
+    """Cooperative stop request for a running search.
+
+    set() only assigns a flag, so it is safe from any thread or a signal handler; the
+    search polls the token every STOP_POLL_INTERVAL nodes and unwinds normally. Pass a
+    multiprocessing.Event to stop a search running in another process.
+    """
+
+    def __init__(self, event=None):
+        self._event = event
+        self._set = False
+
+    def set(self):
+        self._set = True
+        if self._event is not None:
+            self._event.set()
+
+    def clear(self):
+        self._set = False
+        if self._event is not None:
+            self._event.clear()
+
+    def is_set(self) -> bool:
+        return self._set or (self._event is not None and self._event.is_set())
+
+
+# How often (in nodes) the search polls the clock, node limit and stop token
+STOP_POLL_INTERVAL = 256
 
-class TimeoutException(Exception):
-    """Raised when search time limit is exceeded"""
-    pass
+# Stop token of the current search, and whether the search has been told to stop
+stop_token = StopToken()
+search_stopped = False
 
 
-def check_time():
-    global search_start_time, search_time_limit
-    if search_time_limit <= 0:
-        return
-    elapsed = time.time() - search_start_time
-    remaining = search_time_limit - elapsed
-    # Kiểm tra thường xuyên hơn khi sắp hết giờ
-    if remaining < 0:
-        raise TimeoutException()
-    elif remaining < 0.1 and position_count % 256 == 0:
-        raise TimeoutException()
-    elif position_count % 1024 == 0 and elapsed > search_time_limit * 0.9:
-        raise TimeoutException()
+def start_clock(limit):
+    """(Re)start the time limit of the running search from now, e.g. on ponderhit.
+
+    limit is a TimeManager, a fixed number of seconds, or None/0 for no limit.
+    """
+    global search_start_time, search_time_manager
+    search_start_time = time.time()
+    if limit and not isinstance(limit, TimeManager):
+        limit = TimeManager.fixed(limit)
+    if limit:
+        limit.start()
+    search_time_manager = limit or None
+
+
+def check_time() -> bool:
+    """Poll the stop token and limits. Once it returns True every node returns at once."""
+    global search_stopped
+    if search_stopped:
+        return True
+    if stop_token.is_set() or (search_node_limit and position_count >= search_node_limit):
+        search_stopped = True
+    elif search_time_manager is not None and search_time_manager.out_of_time():
+        search_stopped = True
+    return search_stopped
+
 
 def has_non_pawn_material(board: chess.Board) -> bool:
     """Return True if side to move has non-pawn material."""
@@ -56,13 +126,162 @@ def has_non_pawn_material(board: chess.Board) -> bool:
     return False
 
 
-def is_mate_score(score: float) -> bool:
+def is_mate_score(score: int) -> bool:
     """Check if a score represents a mate."""
     return abs(score) > MATE_VALUE - 1000
 
 
+def is_decisive_score(score: int) -> bool:
+    """Mate or tablebase result: a distance from the root that the TT stores relative to the node."""
+    return abs(score) > MAX_EVAL
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """Mate/tablebase distances are stored relative to the node, not the root."""
+    if is_decisive_score(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    """Inverse of score_to_tt for a node at this ply."""
+    if is_decisive_score(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+
+def tablebase_score(wdl: int, ply: int) -> int:
+    """Convert a WDL probe to a search score; cursed wins and blessed losses count as draws."""
+    if wdl >= 2:
+        return TB_WIN_VALUE - ply
+    if wdl <= -2:
+        return -TB_WIN_VALUE + ply
+    return 0
+
+
+def format_score(score: int) -> tuple[str, int]:
+    """UCI score kind and value: ('cp', centipawns) or ('mate', moves, negative when getting mated)."""
+    if is_mate_score(score):
+        mate_in = (MATE_VALUE - abs(score) + 1) // 2
+        return "mate", -mate_in if score < 0 else mate_in
+    return "cp", score
+
+
+@dataclass
+class SearchInfo:
+    """Result of one completed iterative-deepening iteration."""
+    depth: int
+    score: int
+    nodes: int
+    time_ms: int
+    nps: int
+    tbhits: int = 0
+    pv: list = field(default_factory=list)
+    multipv: int = 0  # 1-based line number in MultiPV mode, 0 otherwise
+    hashfull: int = 0  # TT usage in permille
+    stats: "SearchStats" = None  # snapshot of the counters when the search collects them
+
+    def uci(self) -> str:
+        kind, value = format_score(self.score)
+        pv = " ".join(move.uci() for move in self.pv) or "none"
+        line = f" multipv {self.multipv}" if self.multipv else ""
+        return (f"info depth {self.depth}{line} score {kind} {value} time {self.time_ms} "
+                f"nodes {self.nodes} nps {self.nps} hashfull {self.hashfull} tbhits {self.tbhits} pv {pv}")
+
+    def to_dict(self) -> dict:
+        kind, value = format_score(self.score)
+        info = {"depth": self.depth, "score": {kind: value}, "nodes": self.nodes, "time": self.time_ms,
+                "nps": self.nps, "hashfull": self.hashfull, "tbhits": self.tbhits,
+                "pv": [move.uci() for move in self.pv]}
+        if self.multipv:
+            info["multipv"] = self.multipv
+        if self.stats is not None:
+            info["stats"] = self.stats.to_dict()
+        return info
+
+
+@dataclass
+class PVLine:
+    """One root move of a MultiPV result."""
+    move: chess.Move
+    score: int
+    pv: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        kind, value = format_score(self.score)
+        return {"move": self.move.uci(), "score": {kind: value}, "pv": [move.uci() for move in self.pv]}
+
+
+# Deepest quiescence recursion (qdepth runs from 0 to max_qdepth + 1)
+MAX_QDEPTH = 32
+
+
+@dataclass
+class SearchStats:
+    """Optional search counters. Pass one to find_best_move to fill it; with none given
+    each counting site costs a single `is not None` test."""
+    nodes: int = 0
+    qsearch_nodes: int = 0
+    tt_probes: int = 0
+    tt_hits: int = 0
+    tt_cutoffs: int = 0
+    beta_cutoffs: int = 0
+    first_move_cutoffs: int = 0
+    null_move_tries: int = 0
+    null_move_cutoffs: int = 0
+    eval_calls: int = 0
+    eval_cache_hits: int = 0
+    movegen_calls: int = 0
+    # Main-search nodes per ply and quiescence nodes per qdepth
+    ply_nodes: list = field(default_factory=lambda: [0] * (MAX_DEPTH + 1))
+    qsearch_depth_nodes: list = field(default_factory=lambda: [0] * (MAX_QDEPTH + 2))
+
+    @property
+    def main_nodes(self) -> int:
+        return self.nodes - self.qsearch_nodes
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def fail_high_first_rate(self) -> float:
+        """Share of beta cutoffs produced by the first move searched (move ordering quality)."""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    @property
+    def eval_cache_hit_rate(self) -> float:
+        return self.eval_cache_hits / self.eval_calls if self.eval_calls else 0.0
+
+    def snapshot(self) -> "SearchStats":
+        return SearchStats(**{**self.__dict__, "ply_nodes": list(self.ply_nodes),
+                              "qsearch_depth_nodes": list(self.qsearch_depth_nodes)})
+
+    def summary(self) -> str:
+        return (f"main {self.main_nodes} qsearch {self.qsearch_nodes} tt {self.tt_hits}/{self.tt_probes} "
+                f"cut {self.tt_cutoffs} fhf {self.fail_high_first_rate:.2f} "
+                f"null {self.null_move_cutoffs}/{self.null_move_tries} eval {self.eval_calls} "
+                f"cache {self.eval_cache_hits} movegen {self.movegen_calls}")
+
+    def to_dict(self) -> dict:
+        data = {key: value for key, value in self.__dict__.items() if not isinstance(value, list)}
+        data.update(main_nodes=self.main_nodes, tt_hit_rate=round(self.tt_hit_rate, 4),
+                    fail_high_first_rate=round(self.fail_high_first_rate, 4),
+                    eval_cache_hit_rate=round(self.eval_cache_hit_rate, 4))
+        # Histograms without their empty tails
+        for key in ("ply_nodes", "qsearch_depth_nodes"):
+            counts = getattr(self, key)
+            last = max((i for i, n in enumerate(counts) if n), default=-1)
+            data[key] = counts[:last + 1]
+        return data
+
+
+# Counters of the running search, or None when it does not collect them
+search_stats = None
+
+
 class TTEntry:
-    _slots_ = ('depth', 'score', 'flag', 'best_move')
+    __slots__ = ('depth', 'score', 'flag', 'best_move')
 
     def __init__(self, depth, score, flag, best_move):
         self.depth, self.score, self.flag, self.best_move = depth, score, flag, best_move
@@ -70,14 +289,66 @@ class TTEntry:
 
 transposition_table = {}
 
+# Approximate resident size of one TT entry (dict slot + key + TTEntry), used to size the table
+TT_ENTRY_BYTES = 210
+DEFAULT_HASH_MB = 32
+tt_max_entries = (DEFAULT_HASH_MB << 20) // TT_ENTRY_BYTES
+
+
+def set_hash_size(size_mb: float):
+    """Bound the transposition table to about size_mb megabytes (oldest entries are evicted first)."""
+    global tt_max_entries
+    tt_max_entries = max(1, int(size_mb * (1 << 20)) // TT_ENTRY_BYTES)
+    while len(transposition_table) > tt_max_entries:
+        del transposition_table[next(iter(transposition_table))]
+
+
+def hashfull() -> int:
+    """TT usage in permille, as reported by UCI 'hashfull'."""
+    return len(transposition_table) * 1000 // tt_max_entries
+
+
+def tt_store(key: int, entry: TTEntry):
+    if len(transposition_table) >= tt_max_entries and key not in transposition_table:
+        del transposition_table[next(iter(transposition_table))]
+    transposition_table[key] = entry
+
+
+# ==============================================================================
+# EVALUATION CACHE
+# Static evaluations keyed by python-chess' transposition key (pieces, side to move,
+# castling rights, en passant) plus the one bit of the move number the evaluation reads
+# (king activity counts only after KING_ACTIVITY_MIN_FULLMOVE). Positions near the
+# fifty-move limit bypass the cache because their evaluation also depends on the
+# halfmove clock.
+# ==============================================================================
+
+eval_cache = {}
+
+# Resident size of one entry (dict slot + key: 11-tuple with its ints and a flag + score), measured
+# as deep_sizeof / entries of caches filled by depth-4 searches (435-444 B, the most when full);
+# compare with the per-entry column of "python -m src.memory --depth 4"
+EVAL_CACHE_ENTRY_BYTES = 448
+DEFAULT_EVAL_CACHE_MB = 8
+eval_cache_max_entries = (DEFAULT_EVAL_CACHE_MB << 20) // EVAL_CACHE_ENTRY_BYTES
+
+
+def set_eval_cache_size(size_mb: float):
+    """Bound the evaluation cache to about size_mb megabytes (0 disables it)."""
+    global eval_cache_max_entries
+    eval_cache_max_entries = int(size_mb * (1 << 20)) // EVAL_CACHE_ENTRY_BYTES
+    while len(eval_cache) > eval_cache_max_entries:
+        del eval_cache[next(iter(eval_cache))]
+
 
 # ==============================================================================
 # MOVE ORDERING
 # ==============================================================================
 
-def score_move(board: chess.Board, move: chess.Move, depth: int, tt_move: chess.Move = None) -> int:
+def score_move(board: chess.Board, move: chess.Move, depth: int, tt_move: int = NO_MOVE) -> int:
     """Assign score to move: TT > Captures > Promotions > Killers > History."""
-    if tt_move and move == tt_move:
+    code = encode_move(move)
+    if code == tt_move:
         return 10_000_000
     if move.promotion:
         return 9_500_000 + move.promotion
@@ -89,14 +360,14 @@ def score_move(board: chess.Board, move: chess.Move, depth: int, tt_move: chess.
         return 9_000_000  # En-passant
     else:  # Quiet moves
         if depth < MAX_DEPTH:
-            if killer_moves[depth][0] == move:
+            if killer_moves[depth * 2] == code:
                 return 8_000_000
-            if killer_moves[depth][1] == move:
+            if killer_moves[depth * 2 + 1] == code:
                 return 7_900_000
-    return history_heuristic[board.turn][move.from_square][move.to_square]
+    return history_heuristic[(board.turn << 12) | (code & 0xFFF)]
 
 
-def order_moves(board: chess.Board, moves: list[chess.Move], depth: int, tt_move: chess.Move = None) -> list[
+def order_moves(board: chess.Board, moves: list[chess.Move], depth: int, tt_move: int = NO_MOVE) -> list[
     chess.Move]:
     return sorted(moves, key=lambda m: score_move(board, m, depth, tt_move), reverse=True)
 
@@ -105,33 +376,65 @@ def order_moves(board: chess.Board, moves: list[chess.Move], depth: int, tt_move
 # SEARCH ALGORITHMS
 # ==============================================================================
 
-def quiescence_search(gamestate: GameState, alpha: float, beta: float, max_qdepth=32, qdepth=0) -> float:
+def static_eval(board: chess.Board) -> int:
+    """evaluate_board clamped to [-MAX_EVAL, MAX_EVAL] integer centipawns (cached)."""
+    if search_stats is not None:
+        search_stats.eval_calls += 1
+    key = None
+    if eval_cache_max_entries and board.halfmove_clock < 99:
+        key = (board._transposition_key(), board.fullmove_number > KING_ACTIVITY_MIN_FULLMOVE)
+        score = eval_cache.get(key)
+        if score is not None:
+            if search_stats is not None:
+                search_stats.eval_cache_hits += 1
+            return score
+
+    score = evaluate_board(board)
+    if score > MAX_EVAL:
+        score = MAX_EVAL
+    elif score < -MAX_EVAL:
+        score = -MAX_EVAL
+    if key is not None:
+        if len(eval_cache) >= eval_cache_max_entries:
+            del eval_cache[next(iter(eval_cache))]
+        eval_cache[key] = score
+    return score
+
+
+def quiescence_search(gamestate: GameState, alpha: int, beta: int, max_qdepth=MAX_QDEPTH, qdepth=0) -> int:
     global position_count
     position_count += 1
+    if search_stats is not None:
+        search_stats.qsearch_nodes += 1
+        search_stats.qsearch_depth_nodes[qdepth] += 1
 
-    # Check time less frequently in qsearch for performance (every 2048 nodes)
-    if position_count % 2048 == 0:
-        check_time()
+    # Poll the stop conditions every STOP_POLL_INTERVAL nodes; a stopped search returns at once
+    if search_stopped or (position_count % STOP_POLL_INTERVAL == 0 and check_time()):
+        return 0
 
     if qdepth > max_qdepth:
-        return evaluate_board(gamestate.board)
+        return static_eval(gamestate.board)
 
-    stand_pat = evaluate_board(gamestate.board)
+    stand_pat = static_eval(gamestate.board)
     if stand_pat >= beta:
         return beta
     alpha = max(alpha, stand_pat)
 
-    capture_moves = list(gamestate.board.generate_legal_captures())
-    for move in gamestate.board.generate_legal_moves():
-        if move.promotion and not gamestate.board.is_capture(move):
-            capture_moves.append(move)
-
+    check_info = get_check_info(gamestate.board)
+    capture_moves = generate_pseudo_legal_tactical_moves(gamestate.board, check_info)
+    if search_stats is not None:
+        search_stats.movegen_calls += 1
     capture_moves = order_moves(gamestate.board, capture_moves, qdepth)
 
     for move in capture_moves:
+        # Legality is only verified for moves we actually try
+        if not is_safe_move(gamestate.board, check_info, move):
+            continue
         gamestate.make_move(move)
         score = -quiescence_search(gamestate, -beta, -alpha, max_qdepth, qdepth + 1)
         gamestate.unmake_move()
+        if search_stopped:
+            return 0
 
         if score >= beta:
             return beta
@@ -140,253 +443,453 @@ def quiescence_search(gamestate: GameState, alpha: float, beta: float, max_qdept
     return alpha
 
 
-def negamax(gamestate: GameState, depth: int, alpha: float, beta: float, ply: int, do_null: bool = True) -> float:
-    global position_count, killer_moves, history_heuristic
+def negamax(gamestate: GameState, depth: int, alpha: int, beta: int, ply: int, do_null: bool = True) -> int:
+    global position_count
 
-    # Check time less frequently for performance (every 2048 nodes)
-    if position_count % 2048 == 0:
-        check_time()
+    if search_stopped or (position_count % STOP_POLL_INTERVAL == 0 and check_time()):
+        return 0
 
-    # Terminal conditions
-    if gamestate.board.is_game_over():
-        if gamestate.board.is_checkmate():
-            return -MATE_VALUE + ply
+    # Terminal conditions (checkmate/stalemate are detected after the move loop)
+    if gamestate.board.is_insufficient_material():
         return 0
 
     if depth <= 0:
+        # Mate at the horizon needs a check, so only then do we pay for full legal generation
+        if gamestate.board.is_check() and not any(gamestate.board.generate_legal_moves()):
+            return -MATE_VALUE + ply
         return quiescence_search(gamestate, alpha, beta)
 
     position_count += 1
+    if search_stats is not None:
+        search_stats.ply_nodes[min(ply, MAX_DEPTH)] += 1
 
     # Draw detection
     if ply > 0 and (gamestate.board.is_repetition() or gamestate.board.is_fifty_moves()):
         return 0
 
     if ply >= MAX_DEPTH:
-        return evaluate_board(gamestate.board)
+        return static_eval(gamestate.board)
+
+    # Endgame tablebase: an exact WDL result cuts the whole subtree
+    if tablebases is not None and tablebases.can_probe(gamestate.board):
+        wdl = tablebases.probe_wdl(gamestate.board)
+        if wdl is not None:
+            return tablebase_score(wdl, ply)
 
     original_alpha = alpha
     zobrist_key = chess.polyglot.zobrist_hash(gamestate.board)
     tt_entry = transposition_table.get(zobrist_key)
-    tt_move = None
+    tt_move = NO_MOVE
+    if search_stats is not None:
+        search_stats.tt_probes += 1
+        if tt_entry:
+            search_stats.tt_hits += 1
 
-    # Retrieve from TT with mate score adjustment
+    # Retrieve from TT with mate/tablebase score adjustment
     if tt_entry and tt_entry.depth >= depth:
-        tt_score = tt_entry.score
-
-        if is_mate_score(tt_score):
-            if tt_score > 0:
-                tt_score -= ply
-            else:
-                tt_score += ply
+        tt_score = score_from_tt(tt_entry.score, ply)
 
         if tt_entry.flag == TT_EXACT:
+            if search_stats is not None:
+                search_stats.tt_cutoffs += 1
             return tt_score
         elif tt_entry.flag == TT_LOWERBOUND:
             alpha = max(alpha, tt_score)
         elif tt_entry.flag == TT_UPPERBOUND:
             beta = min(beta, tt_score)
         if alpha >= beta:
+            if search_stats is not None:
+                search_stats.tt_cutoffs += 1
             return tt_score
         tt_move = tt_entry.best_move
 
+    # Pin and check information for deferred legality checks, computed once per node
+    check_info = get_check_info(gamestate.board)
+    in_check = check_info is not None and bool(check_info[2])
+
     # Null Move Pruning
     if (do_null and
             depth >= 3 and
-            not gamestate.board.is_check() and
+            not in_check and
             has_non_pawn_material(gamestate.board) and
             not is_mate_score(beta)):
 
+        if search_stats is not None:
+            search_stats.null_move_tries += 1
         gamestate.board.push(chess.Move.null())
         score = -negamax(gamestate, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
         gamestate.board.pop()
+        if search_stopped:
+            return 0
 
         if score >= beta:
+            if search_stats is not None:
+                search_stats.null_move_cutoffs += 1
             return beta
 
-    best_score = float('-inf')
-    best_move = None
-    ordered_moves = order_moves(gamestate.board, list(gamestate.get_legal_moves()), depth, tt_move)
+    best_score = -INF
+    best_move = NO_MOVE
+    ordered_moves = order_moves(gamestate.board, list(generate_pseudo_legal_moves(gamestate.board, check_info)),
+                                depth, tt_move)
+    legal_move_count = 0
+    if search_stats is not None:
+        search_stats.movegen_calls += 1
 
     for move in ordered_moves:
+        if not is_safe_move(gamestate.board, check_info, move):
+            continue
+        legal_move_count += 1
         gamestate.make_move(move)
         score = -negamax(gamestate, depth - 1, -beta, -alpha, ply + 1)
         gamestate.unmake_move()
+        # Scores from an interrupted subtree are meaningless: keep them out of the TT and killers
+        if search_stopped:
+            return 0
 
         if score > best_score:
             best_score = score
-            best_move = move
+            best_move = encode_move(move)
 
         alpha = max(alpha, score)
 
         if alpha >= beta:
+            if search_stats is not None:
+                search_stats.beta_cutoffs += 1
+                if legal_move_count == 1:
+                    search_stats.first_move_cutoffs += 1
             # Update killer moves and history for quiet moves
             if not gamestate.board.is_capture(move) and depth < MAX_DEPTH:
-                if killer_moves[depth][0] != move:
-                    killer_moves[depth][1] = killer_moves[depth][0]
-                    killer_moves[depth][0] = move
-                history_heuristic[gamestate.board.turn][move.from_square][move.to_square] += depth * depth
+                code = encode_move(move)
+                slot = depth * 2
+                if killer_moves[slot] != code:
+                    killer_moves[slot + 1] = killer_moves[slot]
+                    killer_moves[slot] = code
+                history_heuristic[(gamestate.board.turn << 12) | (code & 0xFFF)] += depth * depth
             break
 
-    # Store in TT with mate score adjustment
-    score_to_store = best_score
-    if is_mate_score(best_score):
-        if best_score > 0:
-            score_to_store += ply
-        else:
-            score_to_store -= ply
+    # No legal move: checkmate or stalemate
+    if legal_move_count == 0:
+        return -MATE_VALUE + ply if in_check else 0
+
+    # Store in TT with mate/tablebase score adjustment
+    score_to_store = score_to_tt(best_score, ply)
 
     flag = TT_EXACT
     if best_score <= original_alpha:
         flag = TT_UPPERBOUND
     elif best_score >= beta:
         flag = TT_LOWERBOUND
-    transposition_table[zobrist_key] = TTEntry(depth, score_to_store, flag, best_move)
+    tt_store(zobrist_key, TTEntry(depth, score_to_store, flag, best_move))
 
     return best_score
 
 
-def search_root(gamestate, depth, pv_move=None):
-    alpha, beta = float('-inf'), float('inf')
-    legal_moves = list(gamestate.get_legal_moves())
-    if not legal_moves:
-        return None, evaluate_board(gamestate.board)
+def search_root(gamestate, depth, pv_move=None, multipv: int = 1):
+    """Search all root moves. Returns up to multipv (move, score) pairs, best first.
 
-    best_move = None
-    best_score = float('-inf')
+    alpha is the multipv-th best score so far: a move that can still enter the list
+    gets an exact score, every other move fails low as cheaply as in a single-PV search.
+    Returns None if the search was stopped before the iteration completed.
+    """
+    alpha, beta = -INF, INF
+    legal_moves = list(gamestate.get_legal_moves())
+    best = []
 
     for move in legal_moves:
-        try:
-            gamestate.make_move(move)
-            score = -negamax(gamestate, depth - 1, -beta, -alpha, 1)
-            gamestate.unmake_move()
-        except TimeoutException:
-            gamestate.unmake_move()
-            raise  # propagate to upper level
+        gamestate.make_move(move)
+        score = -negamax(gamestate, depth - 1, -beta, -alpha, 1)
+        gamestate.unmake_move()
+        if search_stopped:
+            return None  # incomplete iteration, the caller keeps the previous result
+
+        if len(best) < multipv or score > best[-1][1]:
+            i = len(best)
+            while i > 0 and score > best[i - 1][1]:
+                i -= 1
+            best.insert(i, (move, score))
+            del best[multipv:]
+            if len(best) == multipv:
+                alpha = max(alpha, best[-1][1])
+
+    return best
+
+def extract_pv(board: chess.Board, first_move: chess.Move = None, max_length: int = MAX_DEPTH) -> list[chess.Move]:
+    """Principal variation from following TT best moves (optionally after a given first move)."""
+    board = board.copy(stack=False)
+    pv = []
+    seen = set()
+    move = first_move
+    while len(pv) < max_length:
+        if move is None:
+            entry = transposition_table.get(chess.polyglot.zobrist_hash(board))
+            if entry is None or entry.best_move == NO_MOVE:
+                break
+            move = decode_move(entry.best_move)
+        if not board.is_legal(move):
+            break
+        board.push(move)
+        pv.append(move)
+        key = chess.polyglot.zobrist_hash(board)
+        if key in seen:
+            break
+        seen.add(key)
+        move = None
+    return pv
 
-        if score > best_score:
-            best_score = score
-            best_move = move
-        alpha = max(alpha, score)
 
-    return best_move, best_score
+def seed_from_analysis_cache(cache, board: chess.Board):
+    """Copy cached root and PV records into the TT.
+
+    Returns (depth, move) when the root has an exact cached result, else None.
+    """
+    root = None
+    board = board.copy(stack=False)
+    seen = set()
+    for ply in range(MAX_DEPTH):
+        key = chess.polyglot.zobrist_hash(board)
+        if key in seen:
+            break
+        seen.add(key)
+        record = cache.probe(key)
+        if record is None:
+            break
+        depth, flag, score, move_code = record
+        tt_store(key, TTEntry(depth, score, flag, move_code))
+        move = decode_move(move_code)
+        if move_code == NO_MOVE or not board.is_legal(move):
+            break
+        if ply == 0 and flag == TT_EXACT:
+            root = (depth, move)
+        board.push(move)
+    return root
+
+
+def save_to_analysis_cache(cache, board: chess.Board, depth: int, score: int, move: chess.Move):
+    """Store a completed root result and the TT records along its PV."""
+    cache.store(chess.polyglot.zobrist_hash(board), depth, TT_EXACT, score, encode_move(move))
+    board = board.copy(stack=False)
+    for pv_move in extract_pv(board, move, depth):
+        board.push(pv_move)
+        key = chess.polyglot.zobrist_hash(board)
+        entry = transposition_table.get(key)
+        if entry is None:
+            break
+        cache.store(key, entry.depth, entry.flag, entry.score, entry.best_move)
+
 
 def age_history_heuristic():
-    """Prevent history scores from overflowing."""
-    global history_heuristic
-    max_value = max(max(max(row) for row in color_table) for color_table in history_heuristic)
-    if max_value > 10000:
-        history_heuristic = [[[val // 2 for val in row] for row in color_table] for color_table in history_heuristic]
+    """Prevent history scores from overflowing (halves the table in place)."""
+    if max(history_heuristic) > 10000:
+        for i in range(len(history_heuristic)):
+            history_heuristic[i] >>= 1
+
+
+def clear_heuristics():
+    """Reset killer moves and history in place."""
+    killer_moves[:] = array('i', [NO_MOVE]) * len(killer_moves)
+    history_heuristic[:] = array('i', [0]) * len(history_heuristic)
+
+
+def clear_search_state():
+    """Forget everything learned in earlier searches (new game). The TT otherwise persists between moves."""
+    transposition_table.clear()
+    eval_cache.clear()
+    clear_heuristics()
+
+
+def get_ponder_move(board: chess.Board, best_move: chess.Move):
+    """Expected reply to best_move from the TT (the second PV move), or None."""
+    if best_move is None:
+        return None
+    pv = extract_pv(board, best_move, 2)
+    return pv[1] if len(pv) == 2 else None
 
 
-def find_best_move(gamestate: GameState, max_depth: int, time_limit_seconds: float = None) -> chess.Move:
+def find_best_move(gamestate: GameState, max_depth: int, time_limit_seconds: float = None,
+                   node_limit: int = None, stop: StopToken = None, info_callback=None, multipv: int = None,
+                   time_manager: TimeManager = None, deterministic: bool = False, stats: SearchStats = None,
+                   mate: int = None):
     """
     Phiên bản an toàn với board: tránh bug 'AI returned illegal move'
     và giữ nguyên cấu trúc gốc của bạn.
+    node_limit: dừng sau khoảng chừng ấy node (kiểm tra mỗi STOP_POLL_INTERVAL node).
+    stop: StopToken; khi được set, trả về nước tốt nhất của độ sâu đã hoàn thành gần nhất.
+    info_callback: gọi với một SearchInfo sau mỗi độ sâu hoàn thành (mỗi dòng PV một lần khi có multipv).
+    multipv: nếu có, trả về list[PVLine] gồm tối đa multipv nước tốt nhất thay vì một chess.Move
+             (không dùng sách khai cuộc / tablebase ở gốc vì cần điểm số cho từng dòng).
+    time_manager: TimeManager theo đồng hồ (src/timeman.py), thay cho time_limit_seconds cố định.
+    deterministic: bỏ qua mọi giới hạn thời gian, TT/heuristic cũ và analysis cache, cố định seed sách:
+                   cùng thế cờ + cùng node_limit/max_depth -> cùng nước đi, điểm số và số node.
+    stats: SearchStats được điền các bộ đếm (node qsearch, TT, cắt beta, null move, eval, movegen,
+           histogram theo ply); không truyền thì không đếm gì.
+    mate: tìm chiếu hết trong mate nước (UCI "go mate"): bỏ qua sách khai cuộc, giới hạn độ sâu 2*mate - 1
+          và dừng ngay khi độ sâu hoàn thành chứng minh được chiếu hết trong chừng ấy nước.
     """
-    global position_count, killer_moves, history_heuristic, transposition_table
-    global search_start_time, search_time_limit
+    iterations = iterate_search(gamestate, max_depth, time_limit_seconds, node_limit, stop, multipv, time_manager,
+                                deterministic, stats, mate)
+    while True:
+        try:
+            info = next(iterations)
+        except StopIteration as done:
+            return done.value
+        if info_callback is not None:
+            info_callback(info)
 
-    # 1️⃣ Opening book
-    try:
-        with polyglot.MemoryMappedReader(
-            r"Cerebellum_Light_3Merge_200916\Cerebellum3Merge.bin"
-        ) as reader:
-            entry = reader.get(gamestate.board)
-            if entry is not None and gamestate.board.is_legal(entry.move):
-                print(f"Book move: {entry.move}")
-                return entry.move
-    except FileNotFoundError:
-        pass
-
-    # 2️⃣ Initialize search
+
+def iterate_search(gamestate: GameState, max_depth: int, time_limit_seconds: float = None,
+                   node_limit: int = None, stop: StopToken = None, multipv: int = None,
+                   time_manager: TimeManager = None, deterministic: bool = False, stats: SearchStats = None,
+                   mate: int = None):
+    """
+    Generator form of find_best_move: yields a SearchInfo per completed depth (per line
+    with multipv) and returns the same result as find_best_move (StopIteration.value).
+
+        for info in iterate_search(state, 6):
+            print(info.depth, info.score, info.pv)
+    """
+    global position_count, transposition_table, tablebases, search_stats
+    global search_node_limit, stop_token, search_stopped
+
+    # Counters are only collected into a caller-provided SearchStats; the node count is reset
+    # before the book/tablebase shortcuts so a move they return reports 0 nodes
+    search_stats = stats
     position_count = 0
-    killer_moves = [[None, None] for _ in range(MAX_DEPTH)]
-    history_heuristic = [[[0] * 64 for _ in range(64)] for _ in range(2)]
-    transposition_table.clear()
 
-    # 3️⃣ Time management setup
-    search_start_time = time.time()
-    if time_limit_seconds:
-        search_time_limit = time_limit_seconds * 2.0  # extra for depth 1
-    else:
-        search_time_limit = 0.0
+    # Deterministic mode: nothing may depend on the clock or on earlier searches. The book pick
+    # uses a generator of its own, so the shared book keeps choosing at random afterwards
+    book_rng = None
+    if deterministic:
+        time_limit_seconds = time_manager = None
+        clear_search_state()
+        book_rng = random.Random(DETERMINISTIC_SEED)
+
+    # Mate search: a mate in N moves takes at most 2N - 1 plies, which bounds the search
+    # when none is found; a book move proves nothing
+    if mate is not None:
+        max_depth = max(1, min(max_depth, 2 * mate - 1))
+
+    # 1️⃣ Opening book
+    book_move = (get_opening_book().choose(gamestate.board, book_rng)
+                 if multipv is None and mate is None else None)
+    if book_move is not None:
+        logger.info(f"Book move: {book_move}")
+        return book_move
+
+    # Endgame tablebase: DTZ at the root picks the move directly
+    tablebases = get_tablebases()
+    if tablebases is not None:
+        tablebases.hits = 0
+        tb_result = tablebases.probe_root(gamestate.board) if multipv is None else None
+        if tb_result is not None:
+            logger.info(f"Tablebase move: {tb_result[0]} (wdl {tb_result[1]})")
+            return tb_result[0]
+
+    # 2️⃣ Initialize search (the TT is kept so pondering and earlier moves keep paying off)
+    search_node_limit = node_limit or 0
+    stop_token = stop if stop is not None else StopToken()
+    search_stopped = False
+    clear_heuristics()
+
+    # 3️⃣ Time management setup: soft/hard limits, extended or shortened after each depth
+    start_clock(time_manager or time_limit_seconds)
 
     best_move_overall = None
+    best_lines = []
     last_completed_depth = 0
 
+    # Persistent analysis cache: seed the TT and skip depths completed in earlier runs
+    # (MultiPV needs every line of the last depth, which the cache does not keep)
+    analysis_cache = get_analysis_cache() if not deterministic else None
+    if analysis_cache is not None and multipv is None:
+        cached = seed_from_analysis_cache(analysis_cache, gamestate.board)
+        if cached is not None:
+            last_completed_depth, best_move_overall = cached
+            logger.info(f"Analysis cache: depth {last_completed_depth} move {best_move_overall.uci()}")
+
     # 4️⃣ Iterative Deepening
-    for depth in range(1, max_depth + 1):
+    for depth in range(last_completed_depth + 1, max_depth + 1):
         try:
-            # Sau độ sâu 1 -> trở về giới hạn bình thường
-            if depth == 2 and time_limit_seconds:
-                search_time_limit = time_limit_seconds * 0.95
-
             # ⚠️ Dùng bản copy của gamestate để tránh phá board gốc
             temp_state = copy.deepcopy(gamestate)
 
-            move, score = search_root(temp_state, depth, best_move_overall)
+            lines = search_root(temp_state, depth, best_move_overall, multipv or 1)
+
+            if search_stopped:
+                elapsed_ms = (time.time() - search_start_time) * 1000
+                logger.info(f"⚠️ Search stopped at depth {depth} after {int(elapsed_ms)}ms")
+                logger.info(f"⚠️ Completed depth: {last_completed_depth}")
+                break
 
+            move, score = lines[0] if lines else (None, static_eval(gamestate.board))
             if move and gamestate.board.is_legal(move):
                 best_move_overall = move
                 last_completed_depth = depth
+                if analysis_cache is not None and multipv is None:
+                    save_to_analysis_cache(analysis_cache, gamestate.board, depth, score, move)
 
             elapsed_ms = (time.time() - search_start_time) * 1000
             nps = int(position_count / (elapsed_ms / 1000)) if elapsed_ms > 0 else 0
-
-            # UCI-formatted score
-            if is_mate_score(score):
-                mate_in = (MATE_VALUE - abs(score) + 1) // 2
-                mate_in = -mate_in if score < 0 else mate_in
-                score_info = f"mate {mate_in}"
+            tbhits = tablebases.hits if tablebases else 0
+            tt_usage = hashfull()
+            if stats is not None:
+                stats.nodes = position_count
+            stats_snapshot = stats.snapshot() if stats is not None else None
+
+            if multipv is None:
+                info = SearchInfo(depth, score, position_count, int(elapsed_ms), nps, tbhits,
+                                  extract_pv(gamestate.board, move, depth) if move else [], 0, tt_usage,
+                                  stats_snapshot)
+                logger.debug(info.uci())
+                yield info
             else:
-                score_info = f"cp {int(score)}"
-
-            print(
-                f"info depth {depth} score {score_info} time {int(elapsed_ms)} "
-                f"nodes {position_count} nps {nps} pv {move.uci() if move else 'none'}"
-            )
+                best_lines = []
+                for k, (line_move, line_score) in enumerate(lines, 1):
+                    pv = extract_pv(gamestate.board, line_move, depth)
+                    best_lines.append(PVLine(line_move, line_score, pv))
+                    info = SearchInfo(depth, line_score, position_count, int(elapsed_ms), nps, tbhits, pv, k,
+                                      tt_usage, stats_snapshot)
+                    logger.debug(info.uci())
+                    yield info
 
             if depth % 5 == 0:
                 age_history_heuristic()
 
-            if is_mate_score(score) and abs(score) > MATE_VALUE - 100:
-                print(f"Mate found at depth {depth}")
+            if mate is not None and score >= MATE_VALUE - (2 * mate - 1):
+                logger.info(f"Mate in {mate} or less found at depth {depth}")
                 break
 
-            # Thông minh dừng sớm nếu depth tiếp theo quá lâu
-            if time_limit_seconds and depth > 1:
-                elapsed = time.time() - search_start_time
-                estimated_next = elapsed * 3
-                if elapsed + estimated_next > time_limit_seconds:
-                    print(f"Time management: stopping before depth {depth + 1}")
-                    break
+            if is_mate_score(score) and abs(score) > MATE_VALUE - 100:
+                logger.info(f"Mate found at depth {depth}")
+                break
 
-        except TimeoutException:
-            elapsed_ms = (time.time() - search_start_time) * 1000
-            print(f"⚠️ Timeout at depth {depth} after {int(elapsed_ms)}ms")
-            print(f"⚠️ Completed depth: {last_completed_depth}")
-            if best_move_overall is None:
-                print("⚠️ Emergency: selecting first legal move")
-                legal_moves = list(gamestate.get_legal_moves())
-                if legal_moves:
-                    best_move_overall = legal_moves[0]
-            break
+            # Dừng sớm nếu nước đi ổn định hoặc độ sâu tiếp theo không kịp xong
+            # (read each depth: ponderhit may install a time manager mid-search)
+            if search_time_manager is not None and not search_time_manager.on_iteration(depth, move, score):
+                logger.info(f"Time management: stopping before depth {depth + 1}")
+                break
 
         except Exception as e:
-            print(f"❌ Exception during search depth {depth}: {e}")
+            logger.warning(f"❌ Exception during search depth {depth}: {e}")
             break
 
     # 5️⃣ Fallback nếu chưa có move hợp lệ
     if not best_move_overall or not gamestate.board.is_legal(best_move_overall):
-        print("⚠️ Fallback: picking first legal move from board")
+        logger.warning("⚠️ Fallback: picking first legal move from board")
         legal_moves = list(gamestate.board.legal_moves)
         if legal_moves:
             best_move_overall = legal_moves[0]
-            print(f"✅ Fallback move used: {best_move_overall.uci()}")
+            logger.warning(f"✅ Fallback move used: {best_move_overall.uci()}")
         else:
-            print("❌ No legal moves (checkmate or stalemate).")
+            logger.info("❌ No legal moves (checkmate or stalemate).")
             best_move_overall = None
 
-    print(f"✅ Best move: {best_move_overall.uci() if best_move_overall else 'none'} (depth {last_completed_depth})")
+    logger.info(f"✅ Best move: {best_move_overall.uci() if best_move_overall else 'none'} (depth {last_completed_depth})")
+    if stats is not None:
+        stats.nodes = position_count
+        logger.info(f"Search stats: {stats.summary()}")
+    if multipv is not None:
+        if not best_lines and best_move_overall is not None:
+            # Nothing completed: the fallback move has no searched score
+            best_lines = [PVLine(best_move_overall, 0, [best_move_overall])]
+        return best_lines
     return best_move_overall
\ No newline at end of file
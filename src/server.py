@@ -0,0 +1,430 @@
+"""
+Local analysis server: JSON lines over TCP or a Unix socket.
+
+    python -m src.server --port 8765 --workers 4
+    python -m src.server --unix /tmp/bot_chess.sock
+    python -m src.server --smoke            # start a server and run a local client against it
+
+Requests, one JSON object per line:
+
+    {"id": 1, "fen": "<fen>", "depth": 8}       # or "movetime" (ms) and/or "nodes"; optional "multipv": N
+                                                # and "deterministic": true (reproducible depth/nodes search)
+    {"cancel": 1}
+
+Responses, one JSON object per line, tagged with the request id:
+
+    {"id": 1, "type": "info", "depth": 3, "score": {"cp": 25}, "nodes": 941, "time": 523, "nps": 1796, "tbhits": 0, "pv": ["b8c6", "g1f3"]}
+    {"id": 1, "type": "bestmove", "move": "b8c6", "ponder": "g1f3"}
+                                                # with multipv > 1: info carries "multipv": k and
+                                                # bestmove a "lines" list of {move, score, pv}
+    {"id": 1, "type": "cancelled"}              # cancelled before it reached a worker
+    {"id": 1, "type": "error", "message": "..."}
+
+Searches run on a farm of worker processes, each keeping its own warm engine and
+transposition table. A running search that is cancelled stops and still reports
+the best move of its last completed depth (with "cancelled": true).
+
+Load control: at most --queue-limit requests wait for a worker (further requests are
+rejected with a "queue full" error), and the server stops reading from a client that
+already has --max-inflight unfinished requests until one of them completes.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+
+import chess
+
+from .board import GameState
+from .book import configure_opening_book
+from .endgame import load_kpk_bitbase
+from .memory import DEFAULT_MEMORY_MB, configure_memory
+from .search import MAX_DEPTH, StopToken, find_best_move, get_ponder_move
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_LIMIT = 64
+DEFAULT_MAX_INFLIGHT = 8
+# Lines longer than this are rejected by the stream reader
+MAX_LINE_BYTES = 1 << 16
+
+
+# ==============================================================================
+# WORKER PROCESS
+# ==============================================================================
+
+def worker_main(worker_id: int, jobs, events, stop_event, hash_mb: int, use_book: bool):
+    """Run searches from the jobs queue until a None job arrives; report on the shared events queue."""
+    configure_memory(hash_mb)
+    load_kpk_bitbase()
+    if not use_book:
+        configure_opening_book(paths=[])
+    stop = StopToken(stop_event)
+
+    def report(info):
+        events.put((worker_id, "info", info.to_dict()))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        try:
+            state = GameState(job["fen"])
+            time_limit = job["movetime"] / 1000 if job.get("movetime") else None
+            multipv = job.get("multipv", 1)
+            result = find_best_move(state, job.get("depth") or MAX_DEPTH, time_limit,
+                                    node_limit=job.get("nodes"), stop=stop, info_callback=report,
+                                    multipv=multipv if multipv > 1 else None,
+                                    deterministic=job.get("deterministic", False))
+            move = result if multipv == 1 else (result[0].move if result else None)
+            ponder = get_ponder_move(state.board, move)
+            message = {"move": move.uci() if move else None, "ponder": ponder.uci() if ponder else None}
+            if multipv > 1:
+                message["lines"] = [line.to_dict() for line in result]
+            events.put((worker_id, "bestmove", message))
+        except Exception as e:
+            events.put((worker_id, "error", {"message": f"{type(e).__name__}: {e}"}))
+
+
+def parse_job(message: dict) -> dict:
+    """Validate a search request. Raises ValueError with a message for the client."""
+    fen = message.get("fen")
+    if not isinstance(fen, str):
+        raise ValueError("missing fen")
+    board = chess.Board(fen)
+    if not board.is_valid():
+        raise ValueError("illegal position")
+    job = {"fen": board.fen()}
+    for key in ("depth", "movetime", "nodes", "multipv"):
+        value = message.get(key)
+        if value is not None:
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{key} must be a positive integer")
+            job[key] = value
+    if not ("depth" in job or "movetime" in job or "nodes" in job):
+        raise ValueError("need depth, movetime or nodes")
+    if message.get("deterministic") is not None:
+        if not isinstance(message["deterministic"], bool):
+            raise ValueError("deterministic must be true or false")
+        if message["deterministic"] and "movetime" in job:
+            raise ValueError("a deterministic search cannot use movetime")
+        job["deterministic"] = message["deterministic"]
+    if job.get("depth", 0) > MAX_DEPTH:
+        raise ValueError(f"depth must be at most {MAX_DEPTH}")
+    return job
+
+
+# ==============================================================================
+# SERVER
+# ==============================================================================
+
+class _Worker:
+    def __init__(self, worker_id: int, ctx):
+        self.id = worker_id
+        self.jobs = ctx.Queue()
+        self.stop_event = ctx.Event()
+        self.process = None
+        self.request = None
+
+
+class _Request:
+    def __init__(self, client_id, conn, job: dict):
+        self.id = client_id
+        self.conn = conn
+        self.job = job
+        self.worker = None
+        self.cancelled = False
+
+
+class _Connection:
+    def __init__(self, writer, max_inflight: int):
+        self.writer = writer
+        self.outbox = asyncio.Queue()
+        self.requests = {}  # client id -> _Request
+        self.max_inflight = max_inflight
+        self.slot_free = asyncio.Event()
+        self.slot_free.set()
+        self.next_id = 0
+
+    def send(self, message: dict):
+        self.outbox.put_nowait(message)
+
+    def finish(self, request: _Request):
+        if self.requests.get(request.id) is request:
+            del self.requests[request.id]
+        self.slot_free.set()
+
+    async def write_loop(self):
+        while True:
+            message = await self.outbox.get()
+            if message is None:
+                break
+            self.writer.write((json.dumps(message) + "\n").encode())
+            await self.writer.drain()
+
+
+class AnalysisServer:
+    def __init__(self, workers: int = None, queue_limit: int = DEFAULT_QUEUE_LIMIT,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT, hash_mb: int = DEFAULT_MEMORY_MB, use_book: bool = True):
+        self.worker_count = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self.max_inflight = max_inflight
+        self.hash_mb = hash_mb
+        self.use_book = use_book
+        self.port = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._workers = []
+        self._idle = []
+        self._pending = deque()
+        self._server = None
+        self._loop = None
+        self._pump = None
+
+    # --- lifecycle ---
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: str = None):
+        self._loop = asyncio.get_running_loop()
+        for worker_id in range(self.worker_count):
+            worker = _Worker(worker_id, self._ctx)
+            worker.process = self._ctx.Process(
+                target=worker_main, daemon=True,
+                args=(worker_id, worker.jobs, self._events, worker.stop_event, self.hash_mb, self.use_book))
+            worker.process.start()
+            self._workers.append(worker)
+            self._idle.append(worker)
+        self._pump = threading.Thread(target=self._pump_events, daemon=True)
+        self._pump.start()
+
+        if unix_path:
+            self._server = await asyncio.start_unix_server(self._handle_client, unix_path, limit=MAX_LINE_BYTES)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port, limit=MAX_LINE_BYTES)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for worker in self._workers:
+            worker.stop_event.set()
+            worker.jobs.put(None)
+        for worker in self._workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._events.put(None)
+        self._workers.clear()
+
+    # --- worker events (read on a thread, handled on the event loop) ---
+
+    def _pump_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            self._loop.call_soon_threadsafe(self._on_event, *event)
+
+    def _on_event(self, worker_id: int, kind: str, payload: dict):
+        worker = self._workers[worker_id]
+        request = worker.request
+        if request is None:
+            return
+        message = {"id": request.id, "type": kind, **payload}
+        if kind == "info":
+            request.conn.send(message)
+            return
+        if request.cancelled:
+            message["cancelled"] = True
+        request.conn.send(message)
+        worker.request = None
+        self._idle.append(worker)
+        request.conn.finish(request)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._pending and self._idle:
+            request = self._pending.popleft()
+            worker = self._idle.pop()
+            # Only the server sets or clears the stop event, and only while the worker is idle or ours
+            worker.stop_event.clear()
+            worker.request = request
+            request.worker = worker
+            worker.jobs.put(request.job)
+
+    # --- requests ---
+
+    def submit(self, conn: _Connection, message: dict):
+        client_id = message.get("id")
+        if client_id is None:
+            client_id = conn.next_id
+            conn.next_id += 1
+        if client_id in conn.requests:
+            conn.send({"id": client_id, "type": "error", "message": "duplicate id"})
+            return
+        try:
+            job = parse_job(message)
+        except ValueError as e:
+            conn.send({"id": client_id, "type": "error", "message": str(e)})
+            return
+        if not self._idle and len(self._pending) >= self.queue_limit:
+            conn.send({"id": client_id, "type": "error", "message": "queue full"})
+            return
+        request = _Request(client_id, conn, job)
+        conn.requests[client_id] = request
+        self._pending.append(request)
+        self._dispatch()
+
+    def cancel(self, conn: _Connection, client_id):
+        request = conn.requests.get(client_id)
+        if request is None or request.cancelled:
+            return
+        request.cancelled = True
+        if request.worker is None:
+            self._pending.remove(request)
+            conn.send({"id": client_id, "type": "cancelled"})
+            conn.finish(request)
+        else:
+            request.worker.stop_event.set()
+
+    async def _handle_client(self, reader, writer):
+        conn = _Connection(writer, self.max_inflight)
+        writer_task = asyncio.create_task(conn.write_loop())
+        try:
+            while True:
+                # Backpressure: stop reading while this client has max_inflight unfinished requests
+                while len(conn.requests) >= conn.max_inflight:
+                    conn.slot_free.clear()
+                    await conn.slot_free.wait()
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    conn.send({"type": "error", "message": f"bad request: {e}"})
+                    continue
+                if "cancel" in message:
+                    self.cancel(conn, message["cancel"])
+                else:
+                    self.submit(conn, message)
+        finally:
+            # Client gone: its searches are of no use to anyone
+            for request in list(conn.requests.values()):
+                self.cancel(conn, request.id)
+            conn.send(None)
+            try:
+                await writer_task
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+# ==============================================================================
+# COMMAND LINE / SMOKE TEST
+# ==============================================================================
+
+SMOKE_FENS = {
+    "long": "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "depth": "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",
+    "nodes": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "overflow": "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+}
+
+
+async def run_smoke() -> bool:
+    """Start a 2-worker server with a queue limit of 1 and check every response type."""
+    server = AnalysisServer(workers=2, queue_limit=1, use_book=False)
+    await server.start(port=0)
+    reader, writer = await asyncio.open_connection(DEFAULT_HOST, server.port)
+
+    def send(message):
+        writer.write((json.dumps(message) + "\n").encode())
+
+    # Two requests occupy both workers, the third waits and the fourth overflows the queue
+    send({"id": "long", "fen": SMOKE_FENS["long"], "depth": 30})
+    send({"id": "depth", "fen": SMOKE_FENS["depth"], "depth": 2, "multipv": 3})
+    send({"id": "nodes", "fen": SMOKE_FENS["nodes"], "nodes": 300})
+    send({"id": "overflow", "fen": SMOKE_FENS["overflow"], "depth": 1})
+    send({"id": "bad", "fen": "not a fen", "depth": 1})
+    await writer.drain()
+
+    finals = {}
+    while len(finals) < 5:
+        message = json.loads(await asyncio.wait_for(reader.readline(), 120))
+        print(json.dumps(message))
+        if message["type"] == "info" and message["id"] == "long" and message["depth"] >= 2:
+            send({"cancel": "long"})
+            await writer.drain()
+        if message["type"] != "info":
+            finals[message["id"]] = message
+
+    writer.close()
+    await server.close()
+
+    def legal(name):
+        move = finals[name].get("move")
+        return move is not None and chess.Move.from_uci(move) in chess.Board(SMOKE_FENS[name]).legal_moves
+
+    checks = {
+        "cancelled search returns its last completed move": legal("long") and finals["long"].get("cancelled"),
+        "multipv depth search": finals["depth"]["type"] == "bestmove" and legal("depth")
+                                and len(finals["depth"]["lines"]) == 3,
+        "queued node-limited search": finals["nodes"]["type"] == "bestmove" and legal("nodes"),
+        "queue limit": finals["overflow"] == {"id": "overflow", "type": "error", "message": "queue full"},
+        "bad fen rejected": finals["bad"]["type"] == "error",
+    }
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return all(checks.values())
+
+
+async def serve(args):
+    server = AnalysisServer(args.workers, args.queue_limit, args.max_inflight, args.hash, not args.no_book)
+    await server.start(args.host, args.port, args.unix)
+    print(f"Analysis server on {args.unix or f'{args.host}:{server.port}'} with {server.worker_count} workers", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON-lines analysis server backed by a pool of engine processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="engine processes (default: CPU count)")
+    parser.add_argument("--queue-limit", type=int, default=DEFAULT_QUEUE_LIMIT, help="requests allowed to wait for a worker")
+    parser.add_argument("--max-inflight", type=int, default=DEFAULT_MAX_INFLIGHT, help="unfinished requests per client")
+    parser.add_argument("--hash", type=int, default=DEFAULT_MEMORY_MB,
+                        help="memory budget MB per worker, shared by all caches (src/memory.py)")
+    parser.add_argument("--no-book", action="store_true", help="do not answer from the opening book")
+    parser.add_argument("--smoke", action="store_true", help="run a local client against a temporary server and exit")
+    args = parser.parse_args(argv)
+
+    if args.smoke:
+        sys.exit(0 if asyncio.run(run_smoke()) else 1)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Syzygy endgame tablebases.
+
+    python -m src.tablebase --check /path/to/syzygy     # root move choice and TB scores on real tables
+"""
+import logging
+import os
+import struct
+from collections import OrderedDict
+
+import chess
+import chess.polyglot
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# ==============================================================================
+# SYZYGY ENDGAME TABLEBASES
+# Optional: nothing is probed unless a directory is configured, either with
+# configure_tablebases() or through the SYZYGY_PATH environment variable
+# (several directories separated by os.pathsep). chess.syzygy is only imported
+# once a prober is created, so processes without tablebases never load it.
+# ==============================================================================
+
+SYZYGY_PATH_ENV = "SYZYGY_PATH"
+PROBE_CACHE_SIZE = 1 << 16
+# Approximate resident size of one WDL cache entry (OrderedDict slot + key)
+PROBE_CACHE_ENTRY_BYTES = 150
+probe_cache_size = PROBE_CACHE_SIZE
+
+# What a damaged or truncated table file raises inside python-chess
+CORRUPT_TABLE_ERRORS = (OSError, ValueError, IndexError, struct.error)
+
+
+class TablebaseProber:
+    """WDL/DTZ probes with an LRU cache of WDL results and a hit counter."""
+
+    def __init__(self, paths, max_pieces: int = None, cache_size: int = None):
+        import chess.syzygy
+        self.tablebase = chess.syzygy.Tablebase()
+        for path in paths:
+            self.tablebase.add_directory(path)
+        available = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+        self.max_pieces = available if max_pieces is None else min(max_pieces, available)
+        self.cache_size = probe_cache_size if cache_size is None else cache_size
+        self.hits = 0
+        self._wdl_cache = OrderedDict()
+        self._reported = set()
+
+    def _table_error(self, board: chess.Board, error: Exception):
+        """A damaged table: the position counts as not covered, reported once per message."""
+        message = f"{type(error).__name__}: {error}"
+        if message not in self._reported:
+            self._reported.add(message)
+            logger.warning(f"Tablebase probe failed ({board.fen()}): {message}")
+
+    def can_probe(self, board: chess.Board) -> bool:
+        return chess.popcount(board.occupied) <= self.max_pieces and not board.castling_rights
+
+    def probe_wdl(self, board: chess.Board):
+        """WDL (-2..2) for the side to move, or None if the position is not covered."""
+        key = chess.polyglot.zobrist_hash(board)
+        wdl = self._wdl_cache.get(key)
+        if wdl is not None:
+            self._wdl_cache.move_to_end(key)
+            self.hits += 1
+            return wdl
+        try:
+            wdl = self.tablebase.probe_wdl(board)
+        except (KeyError, chess.syzygy.MissingTableError):
+            return None
+        except CORRUPT_TABLE_ERRORS as e:
+            self._table_error(board, e)
+            return None
+        self.hits += 1
+        self._wdl_cache[key] = wdl
+        if len(self._wdl_cache) > self.cache_size:
+            self._wdl_cache.popitem(last=False)
+        return wdl
+
+    def probe_root(self, board: chess.Board):
+        """Pick a root move from DTZ tables.
+
+        Returns (move, wdl) or None. Among the moves that keep the best WDL, a winning
+        side takes the shortest way to a zeroing move and a losing side the longest.
+        """
+        if not self.can_probe(board):
+            return None
+        best = None
+        for move in board.legal_moves:
+            board.push(move)
+            mate = board.is_checkmate()
+            try:
+                wdl = -self.tablebase.probe_wdl(board)
+                dtz = -self.tablebase.probe_dtz(board)
+            except (KeyError, chess.syzygy.MissingTableError):
+                return None
+            except CORRUPT_TABLE_ERRORS as e:
+                self._table_error(board, e)
+                return None
+            finally:
+                board.pop()
+            self.hits += 1
+            zeroing = board.is_zeroing(move)
+            if mate:
+                rank = (wdl, 2, 0)
+            elif wdl > 0:
+                # Winning: a zeroing win resets the 50-move counter, otherwise fewer plies is better
+                rank = (wdl, 1 if zeroing else 0, -abs(dtz))
+            elif wdl < 0:
+                rank = (wdl, 0, abs(dtz))
+            else:
+                rank = (wdl, 0, 0)
+            if best is None or rank > best[0]:
+                best = (rank, move, wdl)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def resize_cache(self, cache_size: int):
+        self.cache_size = cache_size
+        while len(self._wdl_cache) > cache_size:
+            self._wdl_cache.popitem(last=False)
+
+    def close(self):
+        self.tablebase.close()
+
+
+_prober = None
+_configured = False
+
+
+def configure_tablebases(paths, max_pieces: int = None):
+    """Open (or with an empty list, disable) the process-wide tablebases."""
+    global _prober, _configured
+    if _prober is not None:
+        _prober.close()
+    paths = [p for p in paths if p and os.path.isdir(p)]
+    _prober = TablebaseProber(paths, max_pieces) if paths else None
+    _configured = True
+    return _prober
+
+
+def set_probe_cache_size(size_mb: float):
+    """Bound the WDL cache of the process-wide prober (and of later ones) to about size_mb."""
+    global probe_cache_size
+    probe_cache_size = int(size_mb * (1 << 20)) // PROBE_CACHE_ENTRY_BYTES
+    if _prober is not None:
+        _prober.resize_cache(probe_cache_size)
+
+
+def get_tablebases():
+    """The process-wide prober, or None when no tablebase directory is available."""
+    if not _configured:
+        configure_tablebases(os.environ.get(SYZYGY_PATH_ENV, "").split(os.pathsep))
+    return _prober
+
+
+# ==============================================================================
+# CHECKS
+# ==============================================================================
+
+# (fen, what the root probe must do); the side to move wins unless stated otherwise
+CHECK_POSITIONS = (
+    ("8/8/8/8/8/2k5/8/K1Q5 b - - 0 1", "losing side"),
+    ("6k1/8/5K2/8/8/8/8/7Q w - - 0 1", "mate in one"),
+    ("k7/8/1K6/8/8/8/8/7R w - - 0 1", "mate in one"),
+    ("8/8/8/3k4/8/8/8/KQ6 w - - 0 1", "shortest win"),
+    ("8/8/4k3/8/8/8/1R6/K7 w - - 0 1", "shortest win"),
+    ("8/3k4/8/8/8/8/1r6/KQ6 w - - 0 1", "zeroing win"),
+    ("8/8/8/8/3k4/8/8/1R2K3 b - - 0 1", "losing side"),
+)
+
+
+def _expected_moves(tablebase, board: chess.Board) -> set:
+    """Moves probe_root may return, worked out move by move from raw WDL/DTZ probes."""
+    outcomes = []
+    for move in board.legal_moves:
+        zeroing = board.is_zeroing(move)
+        board.push(move)
+        outcomes.append((move, board.is_checkmate(), -tablebase.probe_wdl(board), -tablebase.probe_dtz(board),
+                         zeroing))
+        board.pop()
+    best_wdl = max(wdl for _, _, wdl, _, _ in outcomes)
+    mates = {move for move, mate, _, _, _ in outcomes if mate}
+    if mates:
+        return mates
+    candidates = [o for o in outcomes if o[2] == best_wdl]
+    if best_wdl > 0:
+        # Winning: a zeroing move if there is one, else the fewest plies to the next zeroing move
+        if any(o[4] for o in candidates):
+            return {o[0] for o in candidates if o[4]}
+        shortest = min(abs(o[3]) for o in candidates)
+        return {o[0] for o in candidates if abs(o[3]) == shortest}
+    if best_wdl < 0:
+        longest = max(abs(o[3]) for o in candidates)
+        return {o[0] for o in candidates if abs(o[3]) == longest}
+    return {o[0] for o in candidates}
+
+
+def run_checks(paths, report=print) -> bool:
+    """Root move choice, TB scores in the search and their TT round trip; True when all pass."""
+    from . import search
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        failures += not ok
+        report(f"{'ok  ' if ok else 'FAIL'} {name}")
+
+    prober = TablebaseProber(paths)
+    if prober.max_pieces < 4:
+        report("FAIL no 3- and 4-piece Syzygy tables (KQvK, KRvK, KQvKR) found")
+        return False
+    for fen, what in CHECK_POSITIONS:
+        board = chess.Board(fen)
+        found = prober.probe_root(board)
+        move = found[0] if found else None
+        check(f"{what}: {move} for {fen}", move in _expected_moves(prober.tablebase, board))
+
+    # Tablebase scores rank between static evaluations and mates at every ply
+    check("TB win outranks any static evaluation and stays below mates",
+          all(search.MAX_EVAL < search.tablebase_score(2, ply) <= search.TB_WIN_VALUE
+              and not search.is_mate_score(search.tablebase_score(2, ply)) for ply in range(search.MAX_DEPTH + 1)))
+    # TT round trip: a win found 3 plies below a node at ply 4 reads back 3 plies below it at ply 7
+    for wdl in (2, -2):
+        found_at_4 = search.tablebase_score(wdl, 4 + 3)
+        stored = search.score_to_tt(found_at_4, 4)
+        check(f"TT round trip of TB score (wdl {wdl})",
+              search.score_from_tt(stored, 4) == found_at_4
+              and search.score_from_tt(stored, 7) == search.tablebase_score(wdl, 7 + 3))
+
+    prober.close()
+
+    # End to end: the root probe is skipped with multipv, so the win comes from WDL cutoffs in negamax.
+    # Configured through the imported module: under "python -m" this file is __main__, not the
+    # module the search reads its prober from
+    from . import tablebase
+    tablebase.configure_tablebases(paths)
+    try:
+        search.clear_search_state()
+        lines = search.find_best_move(search.GameState("8/8/4k3/8/8/8/1R6/K7 w - - 0 1"), 3, multipv=1)
+        score = lines[0].score if lines else None
+        check(f"KRvK search scores a tablebase win ({score})",
+              score is not None and search.MAX_EVAL < score <= search.TB_WIN_VALUE)
+    finally:
+        tablebase.configure_tablebases([])
+        search.clear_search_state()
+
+    report("all ok" if not failures else f"{failures} check(s) failed")
+    return not failures
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the tablebase root probe and TB scores on real tables.")
+    parser.add_argument("paths", nargs="*", help="Syzygy directories (default: $SYZYGY_PATH)")
+    parser.add_argument("--check", action="store_true", help="run the checks")
+    args = parser.parse_args(argv)
+    paths = args.paths or os.environ.get(SYZYGY_PATH_ENV, "").split(os.pathsep)
+    paths = [p for p in paths if p and os.path.isdir(p)]
+    if not args.check:
+        parser.error("nothing to do without --check")
+    raise SystemExit(0 if run_checks(paths) else 1)
+
+
+if __name__ == "__main__":
+    main()
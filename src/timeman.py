@@ -0,0 +1,288 @@
+"""
+Time management: how long to think about one move.
+
+    python -m src.timeman --clock 60 --inc 0.5           # simulate a game and print every allocation
+    python -m src.timeman --check                        # scenario checks on a simulated clock
+
+A TimeManager is built either from a fixed per-move time or from the clock
+(remaining time, increment, moves to go). It has two limits:
+
+- soft: after a completed iteration the search only starts the next depth while it
+  is under the soft limit (scaled by how stable the root is) and the next depth is
+  expected to finish before the hard limit;
+- hard: the running iteration is abandoned once it is reached.
+
+The soft limit grows when the best move keeps changing or the score drops, and
+shrinks when the same move has come back for several depths. The clock is a
+callable, so the harness below can drive it with simulated time.
+"""
+import random
+import time
+
+# Clock defaults
+DEFAULT_MOVES_TO_GO = 30
+MOVE_OVERHEAD_MS = 50
+MIN_MOVE_TIME_MS = 20
+
+# Never plan more than this share of the remaining clock for one move
+MAX_SOFT_SHARE = 0.2
+# The hard limit is this many soft limits, at most this share of the clock
+HARD_TO_SOFT = 4.0
+MAX_HARD_SHARE = 0.4
+# A fixed per-move time keeps this share as a margin to unwind and report
+FIXED_TIME_SAFETY = 0.9
+
+# The next depth is expected to take about this many times the time used so far
+NEXT_ITERATION_FACTOR = 3.0
+
+# Soft limit scaling
+STABLE_ITERATIONS = 4       # same best move this many depths in a row -> stop early
+STABLE_FACTOR = 0.6
+INSTABILITY_DECAY = 0.5     # weight of earlier best-move changes at each depth
+INSTABILITY_WEIGHT = 0.5    # soft limit grows by this per (decayed) best-move change
+SCORE_DROP_MARGIN = 20      # cp; smaller drops are noise
+SCORE_DROP_SCALE = 200      # cp of drop that doubles the soft limit
+MAX_SCALE = 2.5
+
+
+class TimeManager:
+    """Soft/hard time limits for one move, updated after every completed depth."""
+
+    def __init__(self, soft: float, hard: float, maximum: float = None, adaptive: bool = True, clock=time.time):
+        self.soft = soft
+        self.hard = hard
+        # Allowance while the first depth is still running, so there is always a move to play
+        self.maximum = max(hard, maximum or hard)
+        self.adaptive = adaptive
+        self.clock = clock
+        self.start_time = clock()
+        self.iterations = 0
+        self.best_move = None
+        self.best_score = None
+        self.stable_iterations = 0
+        self.instability = 0.0
+        self.scale = 1.0
+
+    @classmethod
+    def fixed(cls, seconds: float, first_depth_factor: float = 1.0, clock=time.time) -> "TimeManager":
+        """A fixed time per move (UCI movetime, GUI time limit); never extended.
+
+        first_depth_factor > 1 lets a slow first depth run that many times the limit, so
+        a caller whose limit is not binding (the GUI) always gets a searched move.
+        """
+        hard = seconds * FIXED_TIME_SAFETY
+        return cls(hard, hard, maximum=hard * first_depth_factor, adaptive=False, clock=clock)
+
+    @classmethod
+    def from_clock(cls, remaining: float, increment: float = 0.0, moves_to_go: int = None,
+                   overhead: float = MOVE_OVERHEAD_MS / 1000, clock=time.time) -> "TimeManager":
+        """Limits for a move with `remaining` seconds on the clock (all values in seconds)."""
+        moves_to_go = max(1, moves_to_go or DEFAULT_MOVES_TO_GO)
+        minimum = MIN_MOVE_TIME_MS / 1000
+        usable = max(minimum, remaining - overhead)
+        soft = min(remaining / moves_to_go + increment * 3 / 4, remaining * MAX_SOFT_SHARE) - overhead
+        soft = max(minimum, soft)
+        if moves_to_go == 1:
+            # Last move before the time control: the whole clock minus the overhead is ours
+            hard = maximum = usable
+        else:
+            hard = max(soft, min(soft * HARD_TO_SOFT, remaining * MAX_HARD_SHARE - overhead))
+            # A slow first depth may run past the hard limit, but never past the hard share of the clock
+            maximum = max(minimum, remaining * MAX_HARD_SHARE - overhead)
+        return cls(soft, min(hard, usable), maximum=min(maximum, usable), clock=clock)
+
+    def start(self):
+        """Restart the clock from now (e.g. on ponderhit); keeps what earlier depths learned."""
+        self.start_time = self.clock()
+
+    def elapsed(self) -> float:
+        return self.clock() - self.start_time
+
+    def out_of_time(self) -> bool:
+        """Polled during the search: True once the running iteration must be abandoned."""
+        return self.elapsed() >= (self.hard if self.iterations else self.maximum)
+
+    def soft_limit(self) -> float:
+        return min(self.soft * self.scale, self.hard)
+
+    def on_iteration(self, depth: int, move, score: int) -> bool:
+        """Record a completed depth; returns True if the next depth should be started."""
+        self.iterations += 1
+        if self.adaptive:
+            self.instability *= INSTABILITY_DECAY
+            if self.best_move is not None and move != self.best_move:
+                self.instability += 1
+                self.stable_iterations = 0
+            else:
+                self.stable_iterations += 1
+            drop = 0 if self.best_score is None else self.best_score - score
+            scale = 1 + INSTABILITY_WEIGHT * self.instability
+            if drop > SCORE_DROP_MARGIN:
+                scale *= 1 + min(drop, SCORE_DROP_SCALE) / SCORE_DROP_SCALE
+            if self.stable_iterations >= STABLE_ITERATIONS:
+                scale *= STABLE_FACTOR
+            self.scale = min(scale, MAX_SCALE)
+        self.best_move, self.best_score = move, score
+
+        elapsed = self.elapsed()
+        return elapsed < self.soft_limit() and elapsed * (1 + NEXT_ITERATION_FACTOR) <= self.hard
+
+
+# ==============================================================================
+# SIMULATED CLOCK HARNESS
+# ==============================================================================
+
+class SimulatedClock:
+    """Callable clock that only moves when told to."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def simulate_search(manager: TimeManager, clock: SimulatedClock, durations, moves, scores,
+                    poll: float = 0.001) -> tuple[int, float]:
+    """Run a modelled search: depth d takes durations[d - 1] seconds and ends with
+    (moves[d - 1], scores[d - 1]). Returns (completed depth, time used)."""
+    start = clock()
+    completed = 0
+    for depth, duration in enumerate(durations, 1):
+        # Advance in poll steps so a hard stop lands where the real search would notice it
+        spent = 0.0
+        while spent < duration:
+            step = min(poll, duration - spent)
+            clock.advance(step)
+            spent += step
+            if manager.out_of_time():
+                return completed, clock() - start
+        completed = depth
+        if not manager.on_iteration(depth, moves[depth - 1], scores[depth - 1]):
+            break
+    return completed, clock() - start
+
+
+def model_search(rng: random.Random, depths: int = 20, first: float = 0.005, branching: float = 3.5,
+                 change_rate: float = 0.2):
+    """Iteration durations, best moves and scores of an imaginary search."""
+    durations = [first * branching ** d * rng.uniform(0.7, 1.3) for d in range(depths)]
+    moves, scores = [], []
+    move, score = 0, 0
+    for _ in range(depths):
+        if rng.random() < change_rate:
+            move += 1
+            score += rng.randint(-60, 20)
+        else:
+            score += rng.randint(-10, 10)
+        moves.append(move)
+        scores.append(score)
+    return durations, moves, scores
+
+
+def simulate_game(clock_seconds: float, increment: float = 0.0, moves_to_go: int = None, moves: int = 60,
+                  seed: int = 1, report=print) -> float:
+    """Play `moves` modelled searches against one side's clock; returns the time left."""
+    rng = random.Random(seed)
+    clock = SimulatedClock()
+    remaining = clock_seconds
+    for move_no in range(1, moves + 1):
+        to_go = None if moves_to_go is None else moves_to_go - (move_no - 1) % moves_to_go
+        manager = TimeManager.from_clock(remaining, increment, to_go, clock=clock)
+        depth, used = simulate_search(manager, clock, *model_search(rng))
+        remaining -= used + MOVE_OVERHEAD_MS / 1000
+        report(f"move {move_no:3d}: soft {manager.soft:6.3f}s hard {manager.hard:6.3f}s "
+               f"used {used:6.3f}s depth {depth:2d} scale {manager.scale:4.2f} left {remaining:7.3f}s")
+        if remaining < 0:
+            report("flagged")
+            return remaining
+        remaining += increment
+        if moves_to_go is not None and move_no % moves_to_go == 0:
+            remaining += clock_seconds
+    return remaining
+
+
+def run_checks(report=print) -> bool:
+    """Scenario checks of the allocation rules; returns True when all pass."""
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        failures += not ok
+        report(f"{'ok  ' if ok else 'FAIL'} {name}")
+
+    clock = SimulatedClock()
+    durations = [0.01 * 2 ** d for d in range(20)]
+
+    stable = TimeManager.from_clock(60, 0, clock=clock)
+    _, used_stable = simulate_search(stable, clock, durations, [0] * 20, [30] * 20)
+    check("stable best move stops before the soft limit", used_stable < stable.soft)
+
+    unstable = TimeManager.from_clock(60, 0, clock=clock)
+    _, used_unstable = simulate_search(unstable, clock, durations, list(range(20)), [30] * 20)
+    check("changing best move extends past the soft limit", unstable.soft < used_unstable <= unstable.hard + 0.001)
+
+    falling = TimeManager.from_clock(60, 0, clock=clock)
+    _, used_falling = simulate_search(falling, clock, durations, [0] * 20, [-40 * d for d in range(20)])
+    check("falling score extends past the soft limit", falling.soft < used_falling <= falling.hard + 0.001)
+
+    slow = TimeManager.from_clock(10, 0, clock=clock)
+    _, used_slow = simulate_search(slow, clock, [0.01, 0.02, 30.0], [0, 1, 2], [0, 0, 0])
+    check("hard limit cuts a long iteration", abs(used_slow - slow.hard) < 0.002)
+
+    slow_first = TimeManager.from_clock(10, 0.1, clock=clock)
+    depth, used_slow_first = simulate_search(slow_first, clock, [8.0, 1.0], [0, 0], [0, 0])
+    check("slow first depth under 10+0.1 stops at the hard share of the clock",
+          depth == 0 and used_slow_first <= 10 * MAX_HARD_SHARE)
+
+    movetime = TimeManager.fixed(0.1, clock=clock)
+    depth, used_movetime = simulate_search(movetime, clock, [0.15, 1.0], [0, 0], [0, 0])
+    check("slow first depth never overruns a fixed move time", depth == 0 and used_movetime <= 0.1)
+
+    first = TimeManager.fixed(0.1, first_depth_factor=2.0, clock=clock)
+    depth, _ = simulate_search(first, clock, [0.15, 1.0], [0, 0], [0, 0])
+    check("first depth may use the opt-in extra allowance", depth == 1)
+
+    fixed = TimeManager.fixed(1.0, clock=clock)
+    _, used_fixed = simulate_search(fixed, clock, durations, list(range(20)), [30] * 20)
+    check("fixed move time is never extended", used_fixed <= 0.9 + 0.001)
+
+    check("last move before the control may use the whole clock",
+          TimeManager.from_clock(5, 0, moves_to_go=1).hard == 5 - MOVE_OVERHEAD_MS / 1000)
+    check("increment adds to the allocation",
+          TimeManager.from_clock(60, 1).soft > TimeManager.from_clock(60, 0).soft)
+    check("tiny clock still gets the minimum time", TimeManager.from_clock(0.01, 0).soft == MIN_MOVE_TIME_MS / 1000)
+
+    for seed in range(5):
+        left = simulate_game(10, 0.1, moves=80, seed=seed, report=lambda line: None)
+        check(f"sudden death 10+0.1, 80 moves (seed {seed}) never flags", left > 0)
+    left = simulate_game(20, 0, moves_to_go=40, moves=120, report=lambda line: None)
+    check("repeating 40 moves / 20s never flags", left > 0)
+
+    report("all ok" if not failures else f"{failures} check(s) failed")
+    return not failures
+
+
+def main(argv=None):
+    # Imported here: every search process loads this module, only the CLI parses arguments
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate time allocation without waiting.")
+    parser.add_argument("--clock", type=float, default=60.0, help="starting clock (s)")
+    parser.add_argument("--inc", type=float, default=0.0, help="increment per move (s)")
+    parser.add_argument("--movestogo", type=int, default=None, help="moves per time control (default: sudden death)")
+    parser.add_argument("--moves", type=int, default=60, help="moves to simulate")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the modelled searches")
+    parser.add_argument("--check", action="store_true", help="run the scenario checks instead")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        raise SystemExit(0 if run_checks() else 1)
+    left = simulate_game(args.clock, args.inc, args.movestogo, args.moves, args.seed)
+    print(f"Time left after {args.moves} moves: {left:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
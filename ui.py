@@ -1,7 +1,6 @@
 import os
 import sys
-import threading
-import traceback
+import logging
 import queue
 import time
 import tkinter as tk
@@ -9,33 +8,28 @@ from tkinter import simpledialog, filedialog, messagebox
 
 try:
     import chess
-    import chess.pgn
 except Exception:
     print("Please install python-chess: pip install chess")
     sys.exit(1)
 
-# PIL for image resizing (optional but recommended)
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
 
-# Try to import engine API
-try:
-    from src.search import find_best_move
-    FIND_BEST_MOVE_AVAILABLE = True
-except Exception:
-    find_best_move = None
-    FIND_BEST_MOVE_AVAILABLE = False
+def import_pil():
+    """PIL for image resizing (optional but recommended): (Image, ImageTk), or None.
+    Imported when the piece images are loaded, not with this module."""
+    try:
+        from PIL import Image, ImageTk
+        return Image, ImageTk
+    except Exception:
+        return None
 
-# Try to import GameState from engine (optional)
-GameStateClass = None
+# Try to import engine API (the search itself runs in a separate process)
 try:
-    from src.board import GameState as _GS
-    GameStateClass = _GS
+    from src.engine_process import EngineProcess
+    from src.search import format_score
+    ENGINE_AVAILABLE = True
 except Exception:
-    GameStateClass = None
+    EngineProcess = format_score = None
+    ENGINE_AVAILABLE = False
 
 # --- UI constants ---
 SQUARE_SIZE = 64
@@ -44,6 +38,9 @@ BOARD_COLOR_DARK = '#B58863'
 HIGHLIGHT_COLOR = '#A9A9FF'
 MOVE_COLOR = '#77DD77'
 
+# Seconds a timed-out search gets to stop before the engine process is killed
+ENGINE_STOP_GRACE = 2.0
+
 # piece file mapping (in ./pieces/)
 PIECE_FILES = {
     (chess.WHITE, chess.PAWN): 'wP.png',
@@ -61,51 +58,6 @@ PIECE_FILES = {
 }
 
 
-# ---------------------------
-# Adapter to feed your engine
-# ---------------------------
-class _SearchGameStateAdapter:
-    """
-    Minimal adapter providing interface expected by engine code:
-      - .board (a chess.Board instance)
-      - get_legal_moves() -> list of chess.Move
-      - make_move(move)
-      - unmake_move()
-
-    This adapter uses a separate internal board so the engine cannot mutate the GUI's board.
-    """
-    def __init__(self, board: chess.Board):
-        # shallow copy is cheap; the engine will run on a separate board
-        self.board = board.copy()
-
-    def get_legal_moves(self):
-        return list(self.board.legal_moves)
-
-    def make_move(self, move: chess.Move):
-        self.board.push(move)
-
-    def unmake_move(self):
-        self.board.pop()
-
-
-def build_search_state(board: chess.Board):
-    """
-    Build an object acceptable to find_best_move:
-      - If GameStateClass is importable and can be constructed from chess.Board, use it.
-      - Otherwise fall back to adapter above.
-    """
-    if GameStateClass:
-        try:
-            try:
-                return GameStateClass(board.copy())
-            except Exception:
-                return GameStateClass(board=board.copy())
-        except Exception:
-            return _SearchGameStateAdapter(board)
-    else:
-        return _SearchGameStateAdapter(board)
-
-
 # ---------------------------
 # Main GUI
 # ---------------------------
@@ -133,12 +85,20 @@ class ChessGUI(tk.Frame):
         self.move_list_lines = []  # list of lines (strings)
 
         # AI
-        self.ai_available = FIND_BEST_MOVE_AVAILABLE
+        self.ai_available = ENGINE_AVAILABLE
         self.ai_thinking = False
-        self.ai_thread = None
+        self.ai_search_id = None  # engine search whose move will be played
+        self.ai_best_so_far = None  # first PV move of its latest completed depth
         self.ai_max_depth = 3
         self.ai_time_limit = None
-        self.ai_queue = queue.Queue()  # used to post AI moves back to main thread
+        self.ai_ponder = False
+        self.ponder = None  # running ponder search: expected position, search id and result
+        self.ai_queue = queue.Queue()  # messages for _poll_ai_queue that do not come from the engine
+        # Persistent engine process: keeps its tables warm between moves, can be killed
+        self.engine = None
+        if self.ai_available:
+            self.engine = EngineProcess(log_level=logging.getLogger().getEffectiveLevel())
+            self.engine.start()
 
         self._load_defaults()
         self.create_widgets()
@@ -176,7 +136,14 @@ class ChessGUI(tk.Frame):
         tk.Label(ai_frame, text="Time limit (s):").grid(row=2, column=0, sticky='w')
         self.time_var = tk.StringVar(value='' if self.ai_time_limit is None else str(self.ai_time_limit))
         tk.Entry(ai_frame, textvariable=self.time_var, width=6).grid(row=2, column=1, sticky='e')
-        tk.Button(ai_frame, text="Apply", command=self._on_ai_param_change).grid(row=3, column=0, columnspan=2, pady=(6, 0))
+        self.ponder_var = tk.BooleanVar(value=self.ai_ponder)
+        tk.Checkbutton(ai_frame, text="Ponder (think on your time)", variable=self.ponder_var,
+                       command=self._on_ai_param_change).grid(row=3, column=0, columnspan=2, sticky='w')
+        tk.Button(ai_frame, text="Apply", command=self._on_ai_param_change).grid(row=4, column=0, columnspan=2, pady=(6, 0))
+
+        # live evaluation / principal variation of the running search
+        self.eval_var = tk.StringVar(value='')
+        tk.Label(ai_frame, textvariable=self.eval_var, justify='left', anchor='w', wraplength=260).grid(row=5, column=0, columnspan=2, sticky='w', pady=(6, 0))
 
         tk.Button(self, text="Save PGN", command=self.save_pgn).grid(row=5, column=1, sticky='ew', padx=4, pady=2)
         tk.Button(self, text="Load PGN", command=self.load_pgn).grid(row=6, column=1, sticky='ew', padx=4, pady=2)
@@ -204,15 +171,20 @@ class ChessGUI(tk.Frame):
             self.ai_time_limit = None if t == '' else float(t)
         except Exception:
             self.ai_time_limit = None
+        self.ai_ponder = bool(self.ponder_var.get())
+        if not self.ai_ponder:
+            self._stop_pondering()
 
     def load_images(self):
         base = os.path.join(os.path.dirname(__file__), 'pieces') if '__file__' in globals() else 'pieces'
         # Load once at startup; resize with PIL if available
+        pil = import_pil()
         for key, filename in PIECE_FILES.items():
             path = os.path.join(base, filename)
             if os.path.exists(path):
                 try:
-                    if PIL_AVAILABLE:
+                    if pil is not None:
+                        Image, ImageTk = pil
                         img = Image.open(path).convert('RGBA')
                         img = img.resize((SQUARE_SIZE, SQUARE_SIZE), Image.LANCZOS)
                         self.images[key] = ImageTk.PhotoImage(img)
@@ -437,75 +409,168 @@ class ChessGUI(tk.Frame):
         if self.ai_thinking or not self.ai_available:
             return
         self.ai_thinking = True
+        self.ai_best_so_far = None
         self.ai_status_var.set('AI: thinking...')
         self._on_ai_param_change()
 
-        board_snapshot = self.board.copy()
-
-        def _worker(snapshot, depth, time_limit, out_q):
-            try:
-                search_state = build_search_state(snapshot)
-                mv = find_best_move(search_state, max_depth=depth, time_limit_seconds=time_limit)
-                out_q.put(('move', mv))
-            except Exception as e:
-                out_q.put(('error', str(e)))
-                traceback.print_exc()
+        if self.ponder is not None:
+            if self.ponder['fen'] == self.board.fen():
+                self._ponder_hit()
+                return
+            self._stop_pondering()  # miss: whatever it stored in the TT is still reused
 
-        t = threading.Thread(target=_worker, args=(board_snapshot, self.ai_max_depth, self.ai_time_limit, self.ai_queue), daemon=True)
-        t.start()
-        self.ai_thread = t
+        # The engine process searches its own copy of the game and streams back info and the move
+        self.ai_search_id = self.engine.search(self.board, self.ai_max_depth, self.ai_time_limit)
+        self._start_timeout_watch(self.ai_search_id)
 
+    def _start_timeout_watch(self, search_id):
         # --- FAILSAFE TIMEOUT WATCHDOG ---
         if self.ai_time_limit:
             def _timeout_watch():
-                if self.ai_thinking and self.ai_thread and self.ai_thread.is_alive():
+                if self.ai_thinking and self.ai_search_id == search_id:
+                    # The search unwinds and sends the best move of its last completed depth
                     print("[AI] Time limit reached — stopping AI.")
-                    self.ai_thinking = False
-                    self.ai_status_var.set("AI: timeout")
+                    self.engine.stop()
+                    self.ai_status_var.set("AI: timeout, stopping...")
+                    self.master.after(int(ENGINE_STOP_GRACE * 1000), _kill_watch)
+
+            def _kill_watch():
+                if self.ai_thinking and self.ai_search_id == search_id:
+                    print("[AI] Engine did not stop — restarting it.")
+                    self._restart_engine(play_fallback=True)
             self.master.after(int((self.ai_time_limit + 1) * 1000), _timeout_watch)
 
+    def _restart_engine(self, play_fallback: bool = False):
+        """Kill the engine process and start a fresh one (its tables are lost).
+
+        If the AI was to move, play_fallback plays the best move reported so far (the time
+        is used up); otherwise the new engine searches the position again.
+        """
+        search_id, was_thinking = self.ai_search_id, self.ai_thinking
+        self.engine.terminate()
+        self.ponder = None
+        self.ai_search_id = None
+        self.ai_thinking = False
+        self.ai_status_var.set('AI: engine restarted')
+        if not was_thinking:
+            return
+        if play_fallback:
+            move = self.ai_best_so_far
+            if move not in self.board.legal_moves:
+                move = next(iter(self.board.legal_moves), None)
+            # Delivered by _poll_ai_queue like any engine answer
+            self.ai_thinking = True
+            self.ai_search_id = search_id
+            self.ai_queue.put(('bestmove', search_id, move, None))
+        else:
+            self.request_ai_move()
+
+    def _cancel_ai(self):
+        """Stop the running search and pondering; their late answers are ignored."""
+        if self.ai_thinking:
+            self.engine.stop()
+            self.ai_thinking = False
+            self.ai_search_id = None
+            self.ai_status_var.set('AI: ready')
+        self._stop_pondering()
+
+    # --- pondering: search the expected reply while the human thinks ---
+    def _start_pondering(self, ponder_move: chess.Move):
+        snapshot = self.board.copy()
+        snapshot.push(ponder_move)
+        # No time limit until the expected move is actually played (see _ponder_hit)
+        search_id = self.engine.search(snapshot, self.ai_max_depth, ponder=True)
+        self.ponder = {'fen': snapshot.fen(), 'id': search_id, 'result': None}
+        self.ai_status_var.set(f'AI: pondering on {self.board.san(ponder_move)}')
+
+    def _ponder_hit(self):
+        """The expected move was played: the running ponder search becomes the AI search."""
+        ponder, self.ponder = self.ponder, None
+        self.ai_search_id = ponder['id']
+        if ponder['result'] is not None:
+            # Already finished while pondering
+            self.ai_queue.put(('bestmove', ponder['id'], *ponder['result']))
+            return
+        self.engine.ponderhit(ponder['id'], self.ai_time_limit)
+        self._start_timeout_watch(ponder['id'])
+
+    def _stop_pondering(self):
+        if self.ponder is None:
+            return
+        self.ponder = None
+        self.engine.stop()
+        if not self.ai_thinking:
+            self.ai_status_var.set('AI: ready')
+
     def _poll_ai_queue(self):
+        messages = []
         try:
             while True:
-                typ, payload = self.ai_queue.get_nowait()
-                if typ == 'move':
-                    mv = payload
-                    if mv is None:
-                        print('AI returned no move')
-                    else:
-                        try:
-                            if not isinstance(mv, chess.Move):
-                                mv = chess.Move.from_uci(str(mv))
-                        except Exception:
-                            print('AI returned invalid move:', mv)
-                            mv = None
-
-                        if mv is not None and mv in self.board.legal_moves:
-                            self.board.push(mv)
-                            self._append_san(mv)
-                            self.draw_board(full=False)
-                            if self.board.is_game_over():
-                                self.on_game_over()
-                        else:
-                            print('AI returned illegal move:', mv)
-                elif typ == 'error':
-                    print('AI error:', payload)
-
-                # reset status after each message
-                self.ai_thinking = False
-                self.ai_status_var.set('AI: ready' if self.ai_available else 'AI: unavailable')
-
+                messages.append(self.ai_queue.get_nowait())
         except queue.Empty:
             pass
+        if self.engine is not None:
+            messages.extend(self.engine.poll())
+
+        for typ, search_id, *payload in messages:
+            if self.ponder is not None and search_id == self.ponder['id']:
+                # A finished ponder search only matters once its move has been played
+                if typ == 'bestmove':
+                    self.ponder['result'] = payload
+                elif typ == 'error':
+                    self.ponder['result'] = [None, None]
+                continue
+            if not self.ai_thinking or search_id != self.ai_search_id:
+                continue  # answer to a search that was cancelled (undo, new game, ponder miss)
+            if typ == 'info':
+                if payload[0].pv:
+                    self.ai_best_so_far = payload[0].pv[0]
+                self._show_search_info(payload[0])
+                continue
+            if typ == 'bestmove':
+                mv, ponder_move = payload
+                if mv is None:
+                    print('AI returned no move')
+                elif mv in self.board.legal_moves:
+                    self.board.push(mv)
+                    self._append_san(mv)
+                    self.draw_board(full=False)
+                    if self.board.is_game_over():
+                        self.on_game_over()
+                    elif ponder_move is not None and self.ai_ponder:
+                        self.ai_thinking = False
+                        self.ai_search_id = None
+                        self._start_pondering(ponder_move)
+                        continue
+                else:
+                    print('AI returned illegal move:', mv)
+            elif typ == 'error':
+                print('AI error:', payload[0])
 
-        # --- AUTO RECOVER IF THREAD HANGS ---
-        if self.ai_thinking and self.ai_thread and not self.ai_thread.is_alive():
-            print("[AI] Thread ended unexpectedly or timeout expired. Resetting state.")
+            # reset status after each message
             self.ai_thinking = False
-            self.ai_status_var.set('AI: ready')
+            self.ai_search_id = None
+            self.ai_status_var.set('AI: ready' if self.ai_available else 'AI: unavailable')
+
+        # --- AUTO RECOVER IF THE ENGINE PROCESS DIED ---
+        if self.engine is not None and not self.engine.is_alive():
+            print("[AI] Engine process ended unexpectedly. Restarting it.")
+            self._restart_engine()
 
         self.master.after(80, self._poll_ai_queue)
 
+    def _show_search_info(self, info):
+        """Show the score (White's point of view) and PV of a completed search depth."""
+        kind, value = format_score(info.score)
+        if self.board.turn == chess.BLACK:
+            value = -value
+        score = f"{value / 100:+.2f}" if kind == 'cp' else f"#{value}"
+        try:
+            pv = self.board.variation_san(info.pv)
+        except Exception:
+            pv = ' '.join(m.uci() for m in info.pv)
+        self.eval_var.set(f"Eval {score}  depth {info.depth}  {info.nps} nps\n{pv}")
+
     # --- move list / UI helpers (fast incremental SAN appends) ---
     def _append_san(self, last_move: chess.Move):
         """
@@ -554,8 +619,7 @@ class ChessGUI(tk.Frame):
             pass
 
     def undo_move(self):
-        if self.ai_thinking:
-            return
+        self._cancel_ai()
         if self.board.move_stack:
             self.board.pop()
             # rebuild full move list (cheap for single undo)
@@ -565,10 +629,10 @@ class ChessGUI(tk.Frame):
             self.draw_board(full=False)
 
     def new_game(self):
-        if self.ai_thinking:
-            messagebox.showinfo("Please wait", "AI is thinking. Try again later.")
-            return
         if messagebox.askyesno("New Game", "Start a new game?"):
+            self._cancel_ai()
+            if self.engine is not None:
+                self.engine.new_game()
             self.board.reset()
             self.selected_sq = None
             self.legal_moves = []
@@ -595,6 +659,7 @@ class ChessGUI(tk.Frame):
         self.master.wait_window(dlg)
 
         if choice['val']:
+            self._stop_pondering()
             self.human_side = choice['val']
             self.flipped = (self.human_side == 'black')
             self.draw_board(full=False)
@@ -606,6 +671,7 @@ class ChessGUI(tk.Frame):
         self.draw_board(full=True)
 
     def save_pgn(self):
+        import chess.pgn  # deferred: it pulls in chess.engine and asyncio
         game = chess.pgn.Game()
         node = game
         for mv in self.board.move_stack:
@@ -618,14 +684,16 @@ class ChessGUI(tk.Frame):
             messagebox.showinfo('Saved', f'Saved PGN to {fname}')
 
     def load_pgn(self):
-        if self.ai_thinking:
-            return
         fname = filedialog.askopenfilename(filetypes=[('PGN files','*.pgn')])
         if not fname:
             return
         try:
+            import chess.pgn
             with open(fname, 'r', encoding='utf8') as f:
                 game = chess.pgn.read_game(f)
+            self._cancel_ai()
+            if self.engine is not None:
+                self.engine.new_game()
             self.board.reset()
             for mv in game.mainline_moves():
                 self.board.push(mv)
@@ -635,6 +703,7 @@ class ChessGUI(tk.Frame):
             messagebox.showerror('Error', f'Failed to load PGN: {e}')
 
     def on_game_over(self):
+        self._stop_pondering()
         res = 'Game over. '
         if self.board.is_checkmate():
             res += 'Checkmate. '
@@ -651,7 +720,11 @@ class ChessGUI(tk.Frame):
 
 
 if __name__ == '__main__':
+    # engine messages (book move, search stopped, best move...) go to the console
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     root = tk.Tk()
     app = ChessGUI(master=root)
     root.geometry('980x560')
     app.mainloop()
+    if app.engine is not None:
+        app.engine.quit()